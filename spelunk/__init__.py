@@ -1 +1,20 @@
-from .spelunk import get_elements, overwrite_elements, print_obj_tree, hot_swap
+from .spelunk import (
+    get_elements,
+    get_aliases,
+    get_elements_at_paths,
+    iter_elements,
+    aiter_elements,
+    overwrite_elements,
+    overwrite_elements_at_paths,
+    transformed_copy,
+    print_obj_tree,
+    hot_swap,
+    async_hot_swap,
+    compile_hot_swap,
+    HotSwapPlan,
+    register_handler,
+    Address,
+    Path,
+    TraversalTruncatedWarning,
+)
+from .graph import ObjectGraph, get_graph, save_graph, load_graph
@@ -0,0 +1,209 @@
+"""Module containing tools to export the object graph explored by spelunk as node and edge tables"""
+from typing import Any, Callable, Union, Optional, NamedTuple
+from array import array
+from os import PathLike
+import json
+import mmap
+import struct
+import sys
+
+from .spelunk import Address, _PathNode, _traverse
+
+
+_ADDRESSES = list(Address)  # Address codes stored in ObjectGraph.edge_addresses
+_ADDRESS_CODES = {address: code for code, address in enumerate(_ADDRESSES)}
+_MAGIC = b"SPLKGRF1"
+_HEADER_SIZE = struct.Struct("<Q")
+_ALIGNMENT = 8
+_COLUMN_TYPECODES = {
+    "node_ids": "Q",
+    "node_types": "I",
+    "node_sizes": "Q",
+    "edge_parents": "I",
+    "edge_children": "I",
+    "edge_addresses": "B",
+    "edge_keys": "I",
+}
+_JSON_KEY_TYPES = (str, int, float, bool, type(None))
+
+
+class ObjectGraph(NamedTuple):
+    """
+    Graph of the elements of root_obj stored column-wise.
+
+    Node i is the element with id node_ids[i], of type type_names[node_types[i]] and with shallow
+    size node_sizes[i] (as reported by sys.getsizeof). Node 0 is root_obj. Edge j refers from node
+    edge_parents[j] to node edge_children[j] with the step (Address, key) given by
+    list(Address)[edge_addresses[j]] and keys[edge_keys[j]].
+    """
+
+    node_ids: Any  # array or memoryview of unsigned 64 bit ints
+    node_types: Any  # array or memoryview of unsigned ints
+    node_sizes: Any  # array or memoryview of unsigned 64 bit ints
+    edge_parents: Any  # array or memoryview of unsigned ints
+    edge_children: Any  # array or memoryview of unsigned ints
+    edge_addresses: Any  # array or memoryview of unsigned chars
+    edge_keys: Any  # array or memoryview of unsigned ints
+    type_names: list[str]
+    keys: list[Any]
+
+    def edges(self) -> list[tuple[int, int, Address, Any]]:
+        """Collect the edges as (parent index, child index, Address, key) tuples."""
+        return [
+            (parent, child, _ADDRESSES[address], self.keys[key])
+            for parent, child, address, key in zip(
+                self.edge_parents, self.edge_children, self.edge_addresses, self.edge_keys
+            )
+        ]
+
+
+def get_graph(
+    root_obj: Any,
+    unravel_strings: bool = False,
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> ObjectGraph:
+    """
+    Get the graph of all elements within root_obj.
+
+    Each element becomes a single node no matter how many paths refer to it, and each reference
+    becomes an edge, so the size of the graph grows with the number of references within root_obj
+    rather than with the number of paths through it.
+
+    :param root_obj: Root object to search
+    :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :return: ObjectGraph with one node per element and one edge per reference
+    """
+    graph = ObjectGraph(
+        *(array(typecode) for typecode in _COLUMN_TYPECODES.values()), type_names=[], keys=[]
+    )
+    nodes = []  # Keeps every node alive so that its id cannot be reused
+    node_index = {}  # id(obj) -> node index
+    path_index = {}  # id(path) -> node index of the element at path (None if already explored)
+    type_index = {}
+    key_index = {}  # (type(key), key) -> key table index
+
+    def add_edge(path: _PathNode, child: int) -> None:
+        parent = path_index[id(path.parent)]
+        if parent is None:
+            return
+        address_type, key = path.step
+        key_id = key_index.get((type(key), key))
+        if key_id is None:
+            key_id = key_index[type(key), key] = len(graph.keys)
+            graph.keys.append(key)
+        graph.edge_parents.append(parent)
+        graph.edge_children.append(child)
+        graph.edge_addresses.append(_ADDRESS_CODES[address_type])
+        graph.edge_keys.append(key_id)
+
+    def record_revisit(path: _PathNode, obj: Any, cycle_path: Optional[_PathNode]) -> None:
+        add_edge(path, node_index[id(obj)])
+
+    traversal = _traverse(
+        root_obj,
+        element_test=lambda x: True,
+        path_test=lambda x: True,
+        memoize=True,
+        unravel_strings=unravel_strings,
+        descend_test=descend_test,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        on_revisit=record_revisit,
+    )
+    for path, obj in traversal:
+        # Interned primitives are visited once per path rather than once per element
+        idx = node_index.get(id(obj))
+        if idx is None:
+            idx = node_index[id(obj)] = len(nodes)
+            nodes.append(obj)
+            type_name = type(obj).__qualname__
+            type_id = type_index.get(type_name)
+            if type_id is None:
+                type_id = type_index[type_name] = len(graph.type_names)
+                graph.type_names.append(type_name)
+            graph.node_ids.append(id(obj))
+            graph.node_types.append(type_id)
+            graph.node_sizes.append(sys.getsizeof(obj, 0))
+            path_index[id(path)] = idx
+        else:
+            path_index[id(path)] = None
+        if path.parent is not None:
+            add_edge(path, idx)
+    return graph
+
+
+def save_graph(graph: ObjectGraph, file: Union[str, PathLike]) -> None:
+    """
+    Write graph to a binary file that can be memory-mapped by load_graph.
+
+    The file starts with a JSON header holding the type name and key tables followed by the raw
+    contents of each column in native byte order. Keys that are not str, int, float, bool or None
+    are stored as their repr.
+
+    :param graph: ObjectGraph to write
+    :param file: Path of the file to write
+    """
+    columns = []
+    offset = 0
+    for name, typecode in _COLUMN_TYPECODES.items():
+        column = getattr(graph, name)
+        columns.append((name, typecode, len(column), offset))
+        offset += _padded(len(column) * array(typecode).itemsize)
+    header = json.dumps(
+        {
+            "byteorder": sys.byteorder,
+            "type_names": graph.type_names,
+            "keys": [key if isinstance(key, _JSON_KEY_TYPES) else repr(key) for key in graph.keys],
+            "columns": columns,
+        }
+    ).encode()
+    header += b" " * (_padded(len(header)) - len(header))
+    with open(file, "wb") as f:
+        f.write(_MAGIC + _HEADER_SIZE.pack(len(header)) + header)
+        for name, typecode, length, offset in columns:
+            data = getattr(graph, name).tobytes()
+            f.write(data + b"\0" * (_padded(len(data)) - len(data)))
+
+
+def load_graph(file: Union[str, PathLike]) -> ObjectGraph:
+    """
+    Memory-map a graph written by save_graph.
+
+    The columns of the returned graph are read-only memoryviews of the file contents, so they are
+    only paged in as they are accessed.
+
+    :param file: Path of the file to read
+    :return: ObjectGraph whose columns are backed by the file
+    """
+    with open(file, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[: len(_MAGIC)] != _MAGIC:
+        raise ValueError(f"{file} is not a spelunk graph file.")
+    (header_size,) = _HEADER_SIZE.unpack_from(mapped, len(_MAGIC))
+    start = len(_MAGIC) + _HEADER_SIZE.size
+    header = json.loads(mapped[start : start + header_size])
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(f"{file} was written with {header['byteorder']} endian byte order.")
+    start += header_size
+    data = memoryview(mapped)
+    columns = {}
+    for name, typecode, length, offset in header["columns"]:
+        end = start + offset + length * array(typecode).itemsize
+        columns[name] = data[start + offset : end].cast(typecode)
+    return ObjectGraph(**columns, type_names=header["type_names"], keys=header["keys"])
+
+
+def _padded(size: int) -> int:
+    """Round size up to a multiple of the column alignment."""
+    return -(-size // _ALIGNMENT) * _ALIGNMENT
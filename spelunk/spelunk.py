@@ -5,6 +5,10 @@ from typing import (
     Union,
     Optional,
     Generator,
+    AsyncGenerator,
+    Iterable,
+    Iterator,
+    NamedTuple,
 )
 from collections.abc import (
     Collection,
@@ -20,7 +24,15 @@ from collections.abc import (
 from numbers import Number
 from enum import Enum
 import reprlib
-from contextlib import contextmanager
+from copy import copy
+from contextlib import contextmanager, asynccontextmanager
+from itertools import islice
+import re
+import asyncio
+import threading
+from time import monotonic
+import warnings
+import weakref
 
 
 PrettyRepr = reprlib.Repr()
@@ -37,6 +49,10 @@ PrettyRepr.maxdeque = 2
 
 AtomicCollections = (str, ByteString)
 InternedPrimitives = (Number, str, ByteString)  # NoneType is also included
+_EXHAUSTED = object()  # Sentinel marking the end of a child iterator
+_MISSING = object()  # Sentinel for failed lookups
+_PAUSE = object()  # Sentinel yielded by _traverse in place of an element between chunks
+_SWAP_POLL_INTERVAL = 0.01  # Seconds between checks for overlapping hot swaps to end
 
 
 class Address(Enum):
@@ -52,13 +68,292 @@ class Address(Enum):
     VALUES_VIEW_ID = "ValuesViewID"
 
 
+class TraversalTruncatedWarning(UserWarning):
+    """Warning issued when a traversal is cut short by max_depth, max_nodes or timeout."""
+
+
+_ID_ADDRESSES = frozenset(
+    (Address.MUTABLE_SET_ID, Address.IMMUTABLE_SET_ID, Address.VALUES_VIEW_ID)
+)
+
+
+class _PathNode(Sequence):
+    """
+    Path to an element of root_obj stored as a reference to its parent path and a final step.
+
+    Paths found in the same traversal share their common prefixes, so holding many of them costs
+    memory proportional to the number of elements rather than elements times depth. The path
+    behaves as a read-only sequence of (Address, key) steps, which are only collected into a list
+    when the path is iterated or sliced. len(), indexing and reversed() walk up from the final step
+    instead.
+    """
+
+    __slots__ = ("parent", "step", "depth", "rendered")
+
+    def __init__(
+        self,
+        parent: Optional["_PathNode"] = None,
+        step: Optional[tuple[Address, Union[str, int]]] = None,
+    ):
+        self.parent = parent
+        self.step = step
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.rendered = None  # Cached string rendering, see _render_path
+
+    def steps(self) -> list[tuple[Address, Union[str, int]]]:
+        """Collect the steps from the root to this node."""
+        steps = []
+        node = self
+        while node.parent is not None:
+            steps.append(node.step)
+            node = node.parent
+        steps.reverse()
+        return steps
+
+    def __len__(self) -> int:
+        return self.depth
+
+    def __iter__(self) -> Iterator[tuple[Address, Union[str, int]]]:
+        return iter(self.steps())
+
+    def __reversed__(self) -> Iterator[tuple[Address, Union[str, int]]]:
+        node = self
+        while node.parent is not None:
+            yield node.step
+            node = node.parent
+
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, int):
+            # Walk up from the end rather than collecting the steps
+            if idx < 0:
+                idx += self.depth
+            if not 0 <= idx < self.depth:
+                raise IndexError("path index out of range")
+            node = self
+            for _ in range(self.depth - 1 - idx):
+                node = node.parent
+            return node.step
+        if idx == slice(None, -1) and self.parent is not None:
+            return self.parent
+        return self.steps()[idx]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, _PathNode):
+            return self is other or self.steps() == other.steps()
+        if isinstance(other, Sequence) and not isinstance(other, AtomicCollections):
+            return self.depth == len(other) and self.steps() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(self.steps())
+
+
+class Path(Sequence):
+    """
+    Immutable, hashable path to an element of root_obj stored as a tuple of (Address, key) steps.
+
+    Unlike rendered path strings, a Path keeps the original keys (so e.g. the key 1 and the key '1'
+    are told apart) and can be passed back to get_elements_at_paths and overwrite_elements_at_paths.
+    str() renders the path e.g. ROOT['key'][0].attr; both the rendering and the hash are computed
+    once on first use.
+    """
+
+    __slots__ = ("_steps", "_hash", "_rendered")
+
+    def __init__(self, steps: Iterable[tuple[Address, Union[str, int]]] = ()):
+        self._steps = steps._steps if isinstance(steps, Path) else tuple(steps)
+        self._hash = None
+        self._rendered = None
+
+    @property
+    def steps(self) -> tuple[tuple[Address, Union[str, int]], ...]:
+        """The (Address, key) steps from root_obj to the element."""
+        return self._steps
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def __iter__(self) -> Iterator[tuple[Address, Union[str, int]]]:
+        return iter(self._steps)
+
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            return Path(self._steps[idx])
+        return self._steps[idx]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Path):
+            return self is other or self._steps == other._steps
+        if isinstance(other, Sequence) and not isinstance(other, AtomicCollections):
+            return len(self._steps) == len(other) and self._steps == tuple(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(self._steps)
+        return self._hash
+
+    def __str__(self) -> str:
+        if self._rendered is None:
+            self._rendered = _render_path(self._steps)
+        return self._rendered
+
+    def __repr__(self) -> str:
+        return f"Path({self._steps!r})"
+
+
+class _MemberIndex:
+    """
+    Index of the members of set-like containers by id.
+
+    Members of sets and ValuesViews are addressed by id, which otherwise requires scanning the
+    whole container on every lookup. The index is filled in while a traversal iterates over a
+    container and is completed by a single scan on the first lookup that misses, so each later
+    lookup is O(1). Containers are kept alive by the index so that their ids stay valid.
+    """
+
+    __slots__ = ("_containers",)
+
+    def __init__(self) -> None:
+        # id(container) -> [container, {id(member): member}, whether every member is indexed]
+        self._containers = {}
+
+    def _entry(self, container: Collection) -> list:
+        entry = self._containers.get(id(container))
+        if entry is None:
+            entry = self._containers[id(container)] = [container, {}, False]
+        return entry
+
+    def record(self, container: Collection, member: Any) -> None:
+        """Record a member of container seen during traversal."""
+        self._entry(container)[1][id(member)] = member
+
+    def lookup(self, container: Collection, member_id: int) -> Any:
+        """Get the member of container with id member_id or _MISSING if there is none."""
+        entry = self._entry(container)
+        member = entry[1].get(member_id, _MISSING)
+        if member is _MISSING and not entry[2]:
+            entry[1] = {id(m): m for m in container}
+            entry[2] = True
+            member = entry[1].get(member_id, _MISSING)
+        return member
+
+    def replace(self, container: Collection, old_member: Any, new_member: Any) -> None:
+        """Update the index after old_member of container has been replaced by new_member."""
+        members = self._entry(container)[1]
+        members.pop(id(old_member), None)
+        members[id(new_member)] = new_member
+
+
+_ITEM_ADDRESSES = frozenset(
+    (
+        Address.MUTABLE_MAPPING_KEY,
+        Address.IMMUTABLE_MAPPING_KEY,
+        Address.MUTABLE_SEQUENCE_IDX,
+        Address.IMMUTABLE_SEQUENCE_IDX,
+    )
+)
+_MAPPING_ADDRESSES = frozenset((Address.MUTABLE_MAPPING_KEY, Address.IMMUTABLE_MAPPING_KEY))
+_SEQUENCE_ADDRESSES = frozenset((Address.MUTABLE_SEQUENCE_IDX, Address.IMMUTABLE_SEQUENCE_IDX))
+# Containers whose copies are created before their elements are replaced (see _copy_with)
+_EARLY_COPY_ADDRESSES = frozenset(
+    (Address.ATTR, Address.MUTABLE_MAPPING_KEY, Address.MUTABLE_SEQUENCE_IDX)
+)
+_QUERY_TOKEN = re.compile(
+    r"""(?P<recursive>\.\.(?=[^.]))?(?:"""
+    r"""\.?(?P<attr>[^\W\d]\w*|\*)"""
+    r"""|\[\s*(?:(?P<idx>\d+)|'(?P<sq>[^']*)'|"(?P<dq>[^"]*)"|(?P<any_item>\*))\s*\]"""
+    r"""|(?P<any_member>\{\*\}))"""
+)
+
+
+class _QueryPlan:
+    """
+    Traversal plan compiled from a path query e.g. ROOT['services'][*]..password
+
+    A query is a sequence of steps, each of which is one of
+    .name        the attribute name
+    .*           any attribute
+    ['key']      the mapping key whose str() is key
+    [0]          the sequence index 0
+    [*]          any mapping key or sequence index
+    {*}          any set member or values view member
+    and may be preceded by .. to match the step at any depth below the previous one (with the
+    leading dot of an attribute step omitted e.g. ..name). The leading ROOT is optional.
+
+    The query is compiled into a nondeterministic automaton whose states are the number of query
+    steps matched so far. Each path carries the set of states it can be in, so the traversal can
+    skip every element whose path cannot lead to a match.
+    """
+
+    __slots__ = ("query", "steps", "initial", "final")
+
+    def __init__(self, query: str):
+        self.query = query
+        self.steps = []  # (recursive, addresses, key) with key _MISSING matching any key
+        pos = len("ROOT") if query.startswith("ROOT") else 0
+        while pos < len(query):
+            match = _QUERY_TOKEN.match(query, pos)
+            if match is None or (match["attr"] and query[pos] != "." and not match["recursive"]):
+                raise ValueError(f"Invalid path query {query!r} at position {pos}.")
+            if match["attr"] is not None:
+                addresses = frozenset((Address.ATTR,))
+                key = _MISSING if match["attr"] == "*" else match["attr"]
+            elif match["idx"] is not None:
+                addresses, key = _SEQUENCE_ADDRESSES, int(match["idx"])
+            elif match["sq"] is not None or match["dq"] is not None:
+                addresses = _MAPPING_ADDRESSES
+                key = match["sq"] if match["sq"] is not None else match["dq"]
+            elif match["any_item"] is not None:
+                addresses, key = _ITEM_ADDRESSES, _MISSING
+            else:
+                addresses, key = _ID_ADDRESSES, _MISSING
+            self.steps.append((match["recursive"] is not None, addresses, key))
+            pos = match.end()
+        self.initial = frozenset((0,))
+        self.final = len(self.steps)
+
+    def advance(self, states: frozenset, step: tuple[Address, Union[str, int]]) -> frozenset:
+        """Get the states reachable from states by taking step (empty if no match is possible)."""
+        address_type, key = step
+        if address_type in _MAPPING_ADDRESSES:
+            key = str(key)
+        advanced = set()
+        for state in states:
+            if state == self.final:
+                continue
+            recursive, addresses, query_key = self.steps[state]
+            if recursive:
+                advanced.add(state)
+            if address_type in addresses and (query_key is _MISSING or key == query_key):
+                advanced.add(state + 1)
+        return frozenset(advanced)
+
+    def accepts(self, states: frozenset) -> bool:
+        """Whether or not a path in states matches the query."""
+        return self.final in states
+
+    def can_continue(self, states: frozenset) -> bool:
+        """Whether or not the contents of an element in states can still match the query."""
+        return len(states) > 1 or self.final not in states
+
+
 def _get_paths(
     root_obj: Any,
     element_test: Callable[[Any], bool] = lambda x: True,
     path_test: Callable[[Union[str, int]], bool] = lambda x: True,
     memoize: bool = False,
     unravel_strings: bool = False,
-) -> list[list[tuple[Address, Union[str, int]]]]:
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+    member_index: Optional[_MemberIndex] = None,
+) -> list[_PathNode]:
     """
     Get the paths of nested objects in root_obj that satisfy element_test and path_test.
 
@@ -69,141 +364,393 @@ def _get_paths(
                     Note that certain types are never cached (NoneType, Number, str, ByteString) due
                     to interning in CPython.
     :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
-    :return: Collection of paths where each path is a collection of tuples describing the address
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of root_obj that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           root_obj is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element.
+    :param member_index: _MemberIndex to record the members of set-like containers in
+    :return: Collection of paths where each path is a sequence of tuples describing the address
              type and value e.g
              [[(Address.MUTABLE_MAPPING_KEY, 'key'), (Address.MUTABLE_SEQUENCE_IDX, 0)]]
+             Paths share their common prefixes (see _PathNode).
     """
-    output = []
-    _get_paths_helper(
+    traversal = _traverse(
         root_obj,
-        element_test=element_test,
-        path_test=path_test,
-        paths=output,
-        current_path=None,
-        memo=None,
-        memoize=memoize,
-        unravel_strings=unravel_strings,
+        element_test,
+        path_test,
+        memoize,
+        unravel_strings,
+        descend_test=descend_test,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        plan=None if query is None else _QueryPlan(query),
+        full_path_test=full_path_test,
+        member_index=member_index,
     )
-    return output
+    return [path for path, _ in traversal]
 
 
-def _get_paths_helper(
-    obj: Any,
+async def _aget_paths(
+    root_obj: Any,
+    chunk_size: int,
+    member_index: Optional[_MemberIndex] = None,
+    query: Optional[str] = None,
+    **search: Any,
+) -> list[_PathNode]:
+    """
+    Get the paths like _get_paths, handing control back to the event loop after every chunk_size
+    visited elements. The search arguments are those of _get_paths.
+    """
+    traversal = _traverse(
+        root_obj,
+        member_index=member_index,
+        plan=None if query is None else _QueryPlan(query),
+        chunk_size=chunk_size,
+        **search,
+    )
+    paths = []
+    for path, obj in traversal:
+        if path is None:  # Pause between chunks
+            await asyncio.sleep(0)
+        else:
+            paths.append(path)
+    return paths
+
+
+def _traverse(
+    root_obj: Any,
     element_test: Callable[[Any], bool],
     path_test: Callable[[Union[str, int]], bool],
-    paths: list[list[tuple[Address, Union[str, int]]]],
-    current_path: Optional[list[tuple[Address, Union[str, int]]]] = None,
-    memo: Optional[dict[int, bool]] = None,
     memoize: bool = False,
     unravel_strings: bool = False,
-) -> None:
-    """Recursive function that inspects obj and recursively searches any attrs and containers."""
-    if current_path is None:
-        current_path = []
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    member_index: Optional[_MemberIndex] = None,
+    on_revisit: Optional[Callable[[_PathNode, Any, Optional[_PathNode]], None]] = None,
+    plan: Optional[_QueryPlan] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+    on_match: Optional[Callable[[Any, _PathNode, Any], bool]] = None,
+    chunk_size: Optional[int] = None,
+) -> Generator[tuple[_PathNode, Any], None, None]:
+    """
+    Walk root_obj depth-first and yield (path, obj) for each element that passes all tests.
 
-    if memoize and memo is None:
-        memo = {}
+    The walk keeps an explicit stack of child iterators instead of recursing, so there is no limit
+    on the depth of root_obj. Elements are visited in the same pre-order as a recursive walk.
+    Elements for which descend_test returns False are tested but their contents are not explored.
+    The walk stops early once max_nodes elements have been visited or timeout seconds have passed,
+    and does not explore the contents of elements at max_depth. A TraversalTruncatedWarning is
+    issued whenever any of these limits cuts the walk short.
+    If member_index is supplied, the members of set-like containers are recorded in it.
+    If plan is supplied, only elements whose paths match its query are yielded, and elements whose
+    paths cannot lead to a match are neither visited nor explored.
+    If on_match is supplied, it is called with the parent (None for root_obj), the path and the
+    element before each element is yielded, and the element is not explored if it returns True.
+    If chunk_size is supplied, (None, _PAUSE) is also yielded after every chunk_size visited
+    elements, so that the caller can hand control back to e.g. an event loop.
 
-    if memoize and id(obj) in memo and obj is not None and not isinstance(obj, InternedPrimitives):
-        return
-    elif memoize:
-        memo[id(obj)] = True
+    An object reached again while its own contents are being explored (a cycle) is visited but
+    not explored again. With memoize, each object is only visited once. Visited objects are kept
+    alive for the whole walk so that their ids cannot be reused by temporaries (e.g. values created
+    by properties). Whenever an object is not explored because it was already reached, on_revisit
+    (if supplied) is called with the new path, the object and the path at which the object is an
+    ancestor of the new path (i.e. the target of the cycle) or None if the object is shared by
+    another branch.
+    """
+    deadline = None if timeout is None else monotonic() + timeout
+    visited = 0
+    depth_truncated = 0
+    memo = {}  # id(obj) -> obj for visited objects
+    exploring = {}  # id(obj) -> path for objects whose contents are being explored
+    stack = []
+    obj = root_obj
+    path = _PathNode()
+    states = None if plan is None else plan.initial
+    while True:
+        info = _CLASS_INFO.get(id(type(obj))) or _resolve_class_info(obj)
+        _, handler, unravel_handler, interned = info
+        if unravel_strings:
+            handler = unravel_handler
 
-    if current_path and current_path[-1]:
-        path_to_test = current_path[-1][1]
-    else:
-        path_to_test = ""
+        visit = True
+        cycle_path = None
+        if memoize and not interned:
+            if id(obj) in memo:
+                visit = False
+                if on_revisit is not None:
+                    on_revisit(path, obj, exploring.get(id(obj)))
+            else:
+                memo[id(obj)] = obj
+        elif handler is not None:
+            cycle_path = exploring.get(id(obj))
+            if cycle_path is not None and on_revisit is not None:
+                on_revisit(path, obj, cycle_path)
 
-    if element_test(obj) and path_test(path_to_test):
-        paths.append([*current_path])
+        if visit:
+            if max_nodes is not None and visited >= max_nodes:
+                _warn_truncated(f"max_nodes={max_nodes} elements were visited", path)
+                return
+            if deadline is not None and monotonic() >= deadline:
+                _warn_truncated(f"timeout={timeout}s elapsed", path)
+                return
+            visited += 1
+            if chunk_size is not None and not visited % chunk_size:
+                yield None, _PAUSE
 
-    it = None  # iterable to search through
-    get_elem_and_path = None  # func to get next elem and path
-    address_type = None  # Next address type
-    if isinstance(obj, Collection) and (not isinstance(obj, AtomicCollections) or unravel_strings):
-        if isinstance(obj, str) and len(obj) == 1:  # prevents infinite loop with unraveling str
-            return
-        if isinstance(obj, Mapping):
-            if isinstance(obj, MutableMapping):
-                address_type = Address.MUTABLE_MAPPING_KEY
-            else:
-                address_type = Address.IMMUTABLE_MAPPING_KEY
-            it = obj
-            get_elem_and_path = lambda i, ob: (ob.get(i, None), i)
-        elif isinstance(obj, Sequence):
-            if isinstance(obj, MutableSequence):
-                address_type = Address.MUTABLE_SEQUENCE_IDX
-            else:
-                address_type = Address.IMMUTABLE_SEQUENCE_IDX
-            it = enumerate(obj)
-            get_elem_and_path = lambda i, ob: (i[1], i[0])
-        elif isinstance(obj, Set):
-            if isinstance(obj, MutableSet):
-                address_type = Address.MUTABLE_SET_ID
+            if (
+                (plan is None or plan.accepts(states))
+                and element_test(obj)
+                and path_test(path.step[1] if path.parent is not None else "")
+                and (full_path_test is None or full_path_test(path))
+            ):
+                if on_match is not None and on_match(stack[-1][3] if stack else None, path, obj):
+                    handler = None
+                yield path, obj
+            if handler is None or cycle_path is not None:
+                pass
+            elif plan is not None and not plan.can_continue(states):
+                pass
+            elif max_depth is not None and path.depth >= max_depth:
+                if next(iter(handler.children(obj)), _EXHAUSTED) is not _EXHAUSTED:
+                    depth_truncated += 1
+            elif descend_test is None or descend_test(obj, path.step):
+                stack.append((handler.address, iter(handler.children(obj)), path, obj, states))
+                exploring[id(obj)] = path
+
+        # Advance to the next unvisited element, discarding exhausted iterators.
+        while stack:
+            address_type, it, parent_path, parent, parent_states = stack[-1]
+            child = next(it, _EXHAUSTED)
+            if child is _EXHAUSTED:
+                stack.pop()
+                del exploring[id(parent)]
             else:
-                address_type = Address.IMMUTABLE_SET_ID
-            it = obj
-            get_elem_and_path = lambda i, ob: (i, id(i))
-        elif isinstance(obj, ValuesView):
-            address_type = Address.VALUES_VIEW_ID
-            it = obj
-            get_elem_and_path = lambda i, ob: (i, id(i))
-    elif hasattr(obj, "__dict__") or hasattr(obj, "__slots__"):
-        address_type = Address.ATTR
-        it = _collect_all_attrs(obj)
-        get_elem_and_path = lambda i, ob: (getattr(ob, i, None), i)
-
-    if it and get_elem_and_path and address_type:
-        for i in it:
-            elem, path = get_elem_and_path(i, obj)
-            current_path_copy = [*current_path]
-            current_path_copy.append((address_type, path))
-            _get_paths_helper(
-                elem,
-                element_test=element_test,
-                path_test=path_test,
-                paths=paths,
-                current_path=current_path_copy,
-                memo=memo,
-                memoize=memoize,
-                unravel_strings=unravel_strings,
-            )
+                key, obj = child
+                if plan is not None:
+                    states = plan.advance(parent_states, (address_type, key))
+                    if not states:
+                        continue
+                path = _PathNode(parent_path, (address_type, key))
+                if member_index is not None and address_type in _ID_ADDRESSES:
+                    member_index.record(parent, obj)
+                break
+        else:
+            if depth_truncated:
+                _warn_truncated(
+                    f"max_depth={max_depth} was reached; the contents of {depth_truncated} "
+                    "elements were not explored"
+                )
+            return
+
+
+def _warn_truncated(reason: str, path: Optional[_PathNode] = None) -> None:
+    """Report that a traversal was cut short."""
+    message = f"Traversal truncated: {reason}"
+    if path is not None:
+        message += f". Stopped before {_render_path(path)}"
+    warnings.warn(message + ".", TraversalTruncatedWarning, stacklevel=3)
+
+
+class _Handler(NamedTuple):
+    """How to explore the children of instances of a class."""
+
+    address: Address
+    children: Callable[[Any], Iterable[tuple[Union[str, int], Any]]]
+
+
+class _ClassCache(dict):
+    """
+    Cache of values computed once per class and keyed by id(cls).
+
+    Entries are evicted when their class is garbage collected, so classes created at runtime are
+    not kept alive by the cache.
+    """
+
+    def add(self, cls: type, *values: Any) -> tuple:
+        key = id(cls)
+        entry = (weakref.ref(cls, lambda _: self.pop(key, None)), *values)
+        self[key] = entry
+        return entry
+
+
+def _iter_mapping(obj: Mapping) -> Iterator[tuple[Any, Any]]:
+    return iter(obj.items())  # a single pass, rather than a lookup of every key
+
+
+def _iter_members(obj: Collection) -> Iterator[tuple[int, Any]]:
+    return ((id(i), i) for i in obj)
+
+
+def _iter_attrs(obj: Any) -> Iterator[tuple[str, Any]]:
+    return ((i, getattr(obj, i, None)) for i in _collect_all_attrs(obj))
+
+
+def _iter_str(obj: str) -> Iterator[tuple[int, str]]:
+    if len(obj) == 1:  # prevents infinite loop with unraveling str
+        return iter(())
+    return enumerate(obj)
+
+
+_REGISTERED_HANDLERS: dict[type, Optional[_Handler]] = {}
+# id(cls) -> (weakref to cls, handler, handler when unraveling strings, interned)
+_CLASS_INFO = _ClassCache()
+
+
+def register_handler(
+    cls: type,
+    address: Optional[Address],
+    children: Optional[Callable[[Any], Iterable[tuple[Union[str, int], Any]]]] = None,
+) -> None:
+    """
+    Register how instances of cls (and its subclasses) are explored.
+
+    :param cls: Class whose instances are explored with the handler
+    :param address: Address type of the children. It determines how paths are rendered as well as
+                    how children are retrieved and overwritten, so it has to agree with children
+                    (e.g. children with Address.ATTR must be accessible with getattr). If None,
+                    the contents of instances of cls are never explored.
+    :param children: Callable taking an instance of cls and returning an iterable of (key, child)
+                     pairs. Required unless address is None.
+    :return: None
+    """
+    if address is None:
+        _REGISTERED_HANDLERS[cls] = None
+    elif callable(children):
+        _REGISTERED_HANDLERS[cls] = _Handler(address, children)
+    else:
+        raise TypeError("children must be callable unless address is None.")
+    _CLASS_INFO.clear()
+
+
+def _resolve_class_info(obj: Any) -> tuple:
+    """Determine how instances of type(obj) are explored and cache the result."""
+    cls = type(obj)
+    interned = obj is None or isinstance(obj, InternedPrimitives)
+    for klass in cls.__mro__:
+        if klass in _REGISTERED_HANDLERS:
+            handler = _REGISTERED_HANDLERS[klass]
+            return _CLASS_INFO.add(cls, handler, handler, interned)
+
+    attr_handler = None
+    if hasattr(obj, "__dict__") or hasattr(obj, "__slots__"):
+        attr_handler = _Handler(Address.ATTR, _iter_attrs)
+    if not isinstance(obj, Collection):
+        return _CLASS_INFO.add(cls, attr_handler, attr_handler, interned)
+
+    handler = None
+    if isinstance(obj, str):
+        handler = _Handler(Address.IMMUTABLE_SEQUENCE_IDX, _iter_str)
+    elif isinstance(obj, Mapping):
+        if isinstance(obj, MutableMapping):
+            handler = _Handler(Address.MUTABLE_MAPPING_KEY, _iter_mapping)
+        else:
+            handler = _Handler(Address.IMMUTABLE_MAPPING_KEY, _iter_mapping)
+    elif isinstance(obj, Sequence):
+        if isinstance(obj, MutableSequence):
+            handler = _Handler(Address.MUTABLE_SEQUENCE_IDX, enumerate)
+        else:
+            handler = _Handler(Address.IMMUTABLE_SEQUENCE_IDX, enumerate)
+    elif isinstance(obj, Set):
+        if isinstance(obj, MutableSet):
+            handler = _Handler(Address.MUTABLE_SET_ID, _iter_members)
+        else:
+            handler = _Handler(Address.IMMUTABLE_SET_ID, _iter_members)
+    elif isinstance(obj, ValuesView):
+        handler = _Handler(Address.VALUES_VIEW_ID, _iter_members)
+    # Atomic collections are explored by attribute unless strings are unraveled
+    if isinstance(obj, AtomicCollections):
+        return _CLASS_INFO.add(cls, attr_handler, handler, interned)
+    return _CLASS_INFO.add(cls, handler, handler, interned)
+
+
+def _get_handler(obj: Any, unravel_strings: bool = False) -> Optional[_Handler]:
+    """Get the handler used to explore obj, or None if its contents are not explored."""
+    info = _CLASS_INFO.get(id(type(obj))) or _resolve_class_info(obj)
+    return info[2] if unravel_strings else info[1]
 
 
 def _collect_all_attrs(obj: Any) -> list[str]:
     """Collect all entries of __dict__ of obj and __slots__ of inherited classes."""
-    attrs = []
-    if hasattr(obj, "__dict__"):
-        dict_attrs = getattr(obj, "__dict__")
-        for a in dict_attrs:
-            if a not in attrs:
-                attrs.append(a)
-    for cls in obj.__class__.__mro__:
-        if hasattr(cls, "__slots__"):
-            slots = getattr(cls, "__slots__")
-            for a in slots:
-                if a not in attrs:
-                    attrs.append(a)
-    return attrs
+    slot_names = _get_slot_names(obj.__class__)
+    if not hasattr(obj, "__dict__"):
+        return list(slot_names)
+    attrs = dict.fromkeys(obj.__dict__)  # ordered set
+    attrs.update(dict.fromkeys(slot_names))
+    return list(attrs)
+
+
+_SLOT_NAMES = _ClassCache()  # id(cls) -> (weakref to cls, names of slots along the MRO)
+
+
+def _get_slot_names(cls: type) -> tuple[str, ...]:
+    """Get the unique __slots__ entries of all classes in the MRO of cls (cached per class)."""
+    entry = _SLOT_NAMES.get(id(cls))
+    if entry is None:
+        slot_names = {}
+        for klass in cls.__mro__:
+            if hasattr(klass, "__slots__"):
+                slots = getattr(klass, "__slots__")
+                slot_names.update(dict.fromkeys((slots,) if isinstance(slots, str) else slots))
+        entry = _SLOT_NAMES.add(cls, tuple(slot_names))
+    return entry[1]
+
+
+_STEP_FORMATS = {
+    Address.ATTR: ".{}",
+    Address.MUTABLE_MAPPING_KEY: "['{}']",
+    Address.IMMUTABLE_MAPPING_KEY: "['{}']",
+    Address.MUTABLE_SEQUENCE_IDX: "[{}]",
+    Address.IMMUTABLE_SEQUENCE_IDX: "[{}]",
+    Address.MUTABLE_SET_ID: "{{id={}}}",
+    Address.IMMUTABLE_SET_ID: "{{id={}}}",
+    Address.VALUES_VIEW_ID: "{{ValuesView_id={}}}",
+}
 
 
 def _increment_path(parent: str, child: tuple[Address, Union[str, int]]) -> str:
     """Increment the path depending on the address type."""
     entry_type, entry = child
-    if entry_type == Address.ATTR:
-        parent += f".{entry}"
-    elif entry_type in [Address.MUTABLE_MAPPING_KEY, Address.IMMUTABLE_MAPPING_KEY]:
-        parent += f"['{entry}']"
-    elif entry_type in [Address.MUTABLE_SEQUENCE_IDX, Address.IMMUTABLE_SEQUENCE_IDX]:
-        parent += f"[{entry}]"
-    elif entry_type in [Address.MUTABLE_SET_ID, Address.IMMUTABLE_SET_ID]:
-        parent += "{id=" + f"{entry}" + "}"
-    elif entry_type == Address.VALUES_VIEW_ID:
-        parent += "{" + f"ValuesView_id={entry}" + "}"
-    return parent
+    return parent + _STEP_FORMATS.get(entry_type, "").format(entry)
 
 
-def _increment_obj_pointer(parent: Any, child: tuple[Address, Union[str, int]]) -> Any:
+def _render_path(path: Sequence[tuple[Address, Union[str, int]]], root_name: str = "ROOT") -> str:
+    """
+    Render a path as a string starting from root_name e.g. ROOT['key'][0].attr
+
+    The rendering of a _PathNode (and of each of its prefixes) is cached on the node, so rendering
+    sibling paths only formats their final steps.
+    """
+    if isinstance(path, Path) and root_name == "ROOT":
+        return str(path)
+    if not isinstance(path, _PathNode) or root_name != "ROOT":
+        return root_name + "".join(_increment_path("", step) for step in path)
+    pending = []
+    node = path
+    while node.rendered is None and node.parent is not None:
+        pending.append(node)
+        node = node.parent
+    key = root_name if node.rendered is None else node.rendered
+    for node in reversed(pending):
+        key = node.rendered = _increment_path(key, node.step)
+    return key
+
+
+def _increment_obj_pointer(
+    parent: Any,
+    child: tuple[Address, Union[str, int]],
+    member_index: Optional[_MemberIndex] = None,
+) -> Any:
     """Increment the object in memory based on the address type."""
     entry_type, entry = child
     if entry_type == Address.ATTR:
@@ -215,60 +762,108 @@ def _increment_obj_pointer(parent: Any, child: tuple[Address, Union[str, int]])
         Address.IMMUTABLE_SEQUENCE_IDX,
     ]:
         return parent[entry]
-    elif entry_type in [Address.MUTABLE_SET_ID, Address.IMMUTABLE_SET_ID, Address.VALUES_VIEW_ID]:
+    elif entry_type in _ID_ADDRESSES:
+        if member_index is not None:
+            item = member_index.lookup(parent, entry)
+            return None if item is _MISSING else item
         for item in parent:
             if id(item) == entry:
                 return item
 
 
+def _get_child(parent: Any, child: tuple[Address, Union[str, int]], handler: _Handler) -> Any:
+    """Get the child of parent that handler would explore at child, or _MISSING if there is none."""
+    entry_type, entry = child
+    if handler.address != entry_type:
+        return _MISSING
+    if entry_type == Address.ATTR:
+        if (
+            handler.children is _iter_attrs
+            and entry not in getattr(parent, "__dict__", ())
+            and entry not in _get_slot_names(type(parent))
+        ):
+            return _MISSING
+        return getattr(parent, entry, _MISSING)
+    elif entry_type in _MAPPING_ADDRESSES:
+        return parent.get(entry, _MISSING)
+    elif entry_type in _SEQUENCE_ADDRESSES:
+        return parent[entry] if 0 <= entry < len(parent) else _MISSING
+    return _MISSING
+
+
 def _get_elements_from_paths(
-    root_obj: Any, paths: list[list[tuple[Address, Union[str, int]]]]
+    root_obj: Any,
+    paths: list[list[tuple[Address, Union[str, int]]]],
+    member_index: Optional[_MemberIndex] = None,
 ) -> dict[str, Any]:
     """Retrieve all object associated with the supplied paths."""
+    if member_index is None:
+        member_index = _MemberIndex()
     output = {}
-    root_name = "ROOT"
     for path in paths:
-        key = root_name
-        obj = root_obj
-        for stem in path:
-            key = _increment_path(key, stem)
-            obj = _increment_obj_pointer(obj, stem)
-        output[key] = obj
+        output[_render_path(path)] = _get_element_at_path(root_obj, path, member_index)
     return output
 
 
+def _get_element_at_path(
+    root_obj: Any,
+    path: Sequence[tuple[Address, Union[str, int]]],
+    member_index: Optional[_MemberIndex] = None,
+) -> Any:
+    """Retrieve the object at path within root_obj."""
+    obj = root_obj
+    for stem in path:
+        obj = _increment_obj_pointer(obj, stem, member_index)
+    return obj
+
+
 def _overwrite_element(
     parent: Any,
     child: tuple[Address, Union[str, int]],
     overwrite_value: Any = None,
     overwrite_func: Optional[Callable[[Any], Any]] = None,
-) -> Optional[bool]:
+    member_index: Optional[_MemberIndex] = None,
+    journal: Optional[list] = None,
+) -> None:
     """
     Overwrite the parent's element at address.
 
-    It can use a constant overwrite_value or the callable overwrite_func
+    It can use a constant overwrite_value or the callable overwrite_func. Set members are looked
+    up through member_index when it is supplied. If journal is supplied, (parent, address,
+    original value) is appended to it once the element is overwritten, such that overwriting the
+    parent's element at address with the original value undoes the change (see _undo_journal).
     """
     entry_type, entry = child
     if entry_type == Address.ATTR:
+        original = getattr(parent, entry, None)
         if callable(overwrite_func):
-            overwrite_value = overwrite_func(getattr(parent, entry, None))
+            overwrite_value = overwrite_func(original)
         setattr(parent, entry, overwrite_value)
     elif entry_type == Address.MUTABLE_MAPPING_KEY:
+        original = parent.get(entry, None)
         if callable(overwrite_func):
-            overwrite_value = overwrite_func(parent.get(entry, None))
+            overwrite_value = overwrite_func(original)
         parent[entry] = overwrite_value
     elif entry_type == Address.MUTABLE_SEQUENCE_IDX:
+        original = parent[entry]
         if callable(overwrite_func):
-            overwrite_value = overwrite_func(parent[entry])
+            overwrite_value = overwrite_func(original)
         parent[entry] = overwrite_value
     elif entry_type == Address.MUTABLE_SET_ID:
-        for item in parent:
-            if id(item) == entry:
-                if callable(overwrite_func):
-                    overwrite_value = overwrite_func(item)
-                parent.remove(item)
-                parent.add(overwrite_value)
-                break
+        if member_index is not None:
+            item = member_index.lookup(parent, entry)
+        else:
+            item = next((item for item in parent if id(item) == entry), _MISSING)
+        if item is _MISSING:
+            return
+        if callable(overwrite_func):
+            overwrite_value = overwrite_func(item)
+        parent.remove(item)
+        parent.add(overwrite_value)
+        if member_index is not None:
+            member_index.replace(parent, item, overwrite_value)
+        # The member is now found by the id of its replacement
+        original, child = item, (entry_type, id(overwrite_value))
     elif entry_type in [
         Address.IMMUTABLE_SEQUENCE_IDX,
         Address.IMMUTABLE_MAPPING_KEY,
@@ -280,6 +875,8 @@ def _overwrite_element(
         raise ValueError(
             f"Address of child must correspond to an Address enum value, not {entry_type}."
         )
+    if journal is not None:
+        journal.append((parent, child, original))
 
 
 def _overwrite_elements_at_paths(
@@ -289,25 +886,476 @@ def _overwrite_elements_at_paths(
     overwrite_func: Optional[Callable[[Any], Any]] = None,
     silent: bool = False,
     raise_on_exception: bool = True,
+    member_index: Optional[_MemberIndex] = None,
+    journal: Optional[list] = None,
+    trie: Optional[list] = None,
 ) -> None:
-    """Overwrite each elem at each path with overwrite_value or overwrite_func."""
-    root_name = "ROOT"
+    """
+    Overwrite each elem at each path with overwrite_value or overwrite_func.
+
+    The paths are grouped into a trie by their parents, so that each shared prefix is walked only
+    once and all the elements written within the same parent are written together. Elements are
+    written before the paths below them are walked, so those paths are resolved within the new
+    values. Each write is recorded in journal when it is supplied (see _overwrite_element). A trie
+    previously built from paths by _build_path_trie can be supplied instead of the paths.
+    """
+    if member_index is None:
+        member_index = _MemberIndex()
+    stack = [(root_obj, _build_path_trie(paths) if trie is None else trie)]
+    while stack:
+        parent, (writes, children) = stack.pop()
+        if writes:
+            _overwrite_children(
+                parent,
+                writes,
+                overwrite_value,
+                overwrite_func,
+                silent,
+                raise_on_exception,
+                member_index,
+                journal,
+            )
+        stack.extend(
+            (_increment_obj_pointer(parent, step, member_index), child)
+            for step, child in reversed(children.items())
+        )
+
+
+def _build_path_trie(paths: Iterable[Sequence[tuple[Address, Union[str, int]]]]) -> list:
+    """
+    Group paths by their parents into a trie of [[(step, path) written], {step: child}] nodes.
+
+    The parents of _PathNodes are looked up by identity and attached at their nearest ancestor
+    already in the trie, so prefixes shared between them are not collected again.
+    """
+    root = [[], {}]
+    nodes = {}  # id(_PathNode) -> trie node of the element at that path
+    last_parent, node = None, root
     for path in paths:
-        key = root_name
-        obj = root_obj
-        for branch in path[:-1]:
-            key = _increment_path(key, branch)
-            obj = _increment_obj_pointer(obj, branch)
+        if not path:
+            raise IndexError("Cannot overwrite root_obj in-place.")
+        if not isinstance(path, _PathNode):
+            node = root
+            for step in path[:-1]:
+                node = _trie_child(node, step)
+            last_parent = None
+        elif path.parent is not last_parent:
+            last_parent = pending = path.parent
+            prefixes = []
+            while pending.parent is not None and id(pending) not in nodes:
+                prefixes.append(pending)
+                pending = pending.parent
+            node = root if pending.parent is None else nodes[id(pending)]
+            for pending in reversed(prefixes):
+                node = nodes[id(pending)] = _trie_child(node, pending.step)
+        node[0].append((path[-1], path))
+    return root
+
+
+def _trie_child(node: list, step: tuple[Address, Union[str, int]]) -> list:
+    """Get (or add) the child of a path trie node at step."""
+    child = node[1].get(step)
+    if child is None:
+        child = node[1][step] = [[], {}]
+    return child
+
+
+def _overwrite_children(
+    parent: Any,
+    writes: list[tuple[tuple[Address, Union[str, int]], Sequence]],
+    overwrite_value: Any,
+    overwrite_func: Optional[Callable[[Any], Any]],
+    silent: bool,
+    raise_on_exception: bool,
+    member_index: _MemberIndex,
+    journal: Optional[list] = None,
+) -> None:
+    """
+    Overwrite the children of parent at each (step, path) in writes.
+
+    Distinct items of a plain list or dict are written together with a single slice assignment
+    or update. Anything else is written one path at a time.
+    """
+    address_type = writes[0][0][0]
+    if (
+        (type(parent) is list and address_type == Address.MUTABLE_SEQUENCE_IDX)
+        or (type(parent) is dict and address_type == Address.MUTABLE_MAPPING_KEY)
+    ) and all(step[0] == address_type for step, _ in writes):
+        keys = [step[1] for step, _ in writes]
+        if type(parent) is dict:
+            bulk = len(set(keys)) == len(keys)
+        else:
+            start = keys[0]
+            bulk = 0 <= start and start + len(keys) <= len(parent)
+            bulk = bulk and all(key == start + i for i, key in enumerate(keys))
+        if bulk:
+            _overwrite_items(
+                parent,
+                keys,
+                writes,
+                overwrite_value,
+                overwrite_func,
+                silent,
+                raise_on_exception,
+                journal,
+            )
+            return
+    for step, path in writes:
         try:
-            _overwrite_element(obj, path[-1], overwrite_value, overwrite_func)
+            _overwrite_element(parent, step, overwrite_value, overwrite_func, member_index, journal)
         except TypeError as e:
-            if not silent:
-                print(
-                    f"Failed to overwrite {_increment_obj_pointer(obj, path[-1])} at "
-                    f"{_increment_path(key, path[-1])}."
-                )
-            if raise_on_exception:
-                raise e
+            _report_failed_overwrite(e, parent, path, silent, raise_on_exception, member_index)
+
+
+def _overwrite_items(
+    parent: Union[list, dict],
+    keys: list[Union[str, int]],
+    writes: list[tuple[tuple[Address, Union[str, int]], Sequence]],
+    overwrite_value: Any,
+    overwrite_func: Optional[Callable[[Any], Any]],
+    silent: bool,
+    raise_on_exception: bool,
+    journal: Optional[list] = None,
+) -> None:
+    """
+    Overwrite the distinct items of parent at keys (a contiguous range for lists) at once.
+
+    As when writing one item at a time, the items computed before overwrite_func raises (or a
+    TypeError is raised with raise_on_exception) are still written.
+    """
+    written_keys, values = [], []
+    try:
+        if callable(overwrite_func):
+            for key, (_, path) in zip(keys, writes):
+                old_value = parent.get(key, None) if type(parent) is dict else parent[key]
+                try:
+                    values.append(overwrite_func(old_value))
+                except TypeError as e:
+                    _report_failed_overwrite(e, parent, path, silent, raise_on_exception)
+                else:
+                    written_keys.append(key)
+        else:
+            written_keys, values = keys, [overwrite_value] * len(keys)
+    finally:
+        if journal is not None:
+            address_type = writes[0][0][0]
+            get = parent.get if type(parent) is dict else parent.__getitem__
+            journal.extend((parent, (address_type, key), get(key)) for key in written_keys)
+        if type(parent) is dict:
+            parent.update(zip(written_keys, values))
+        elif len(written_keys) == len(keys):
+            parent[keys[0] : keys[0] + len(keys)] = values
+        else:
+            for key, value in zip(written_keys, values):
+                parent[key] = value
+
+
+def _report_failed_overwrite(
+    error: TypeError,
+    parent: Any,
+    path: Sequence[tuple[Address, Union[str, int]]],
+    silent: bool,
+    raise_on_exception: bool,
+    member_index: Optional[_MemberIndex] = None,
+) -> None:
+    """Print and/or raise the error raised while overwriting the element at path."""
+    if not silent:
+        print(
+            f"Failed to overwrite {_increment_obj_pointer(parent, path[-1], member_index)} at "
+            f"{_render_path(path)}."
+        )
+    if raise_on_exception:
+        raise error
+
+
+def _undo_journal(journal: list, member_index: Optional[_MemberIndex] = None) -> None:
+    """Undo the writes recorded in journal by _overwrite_element, most recent first."""
+    while journal:
+        parent, child, original = journal.pop()
+        _overwrite_element(parent, child, original, member_index=member_index)
+
+
+def _copy_along_paths(
+    root_obj: Any,
+    paths: list[Sequence[tuple[Address, Union[str, int]]]],
+    overwrite_value: Any = None,
+    overwrite_func: Optional[Callable[[Any], Any]] = None,
+    member_index: Optional[_MemberIndex] = None,
+    revisits: Iterable[tuple[_PathNode, Any]] = (),
+) -> Any:
+    """
+    Copy root_obj with each elem at each path replaced by overwrite_value or overwrite_func.
+
+    Only the containers along the paths are copied (see _copy_with) and all other elements are
+    shared with root_obj. A replacement is used as is, so the paths below a replaced element (or
+    below root_obj, if it is replaced itself) are dropped. The paths reaching the same container
+    are merged, so it is copied once with the replacements of all of them. Each (path, obj) in
+    revisits is another reference to obj (see on_revisit of _traverse), along which the containers
+    are copied as well whenever obj is copied, so that it refers to the copy of obj. A reference to
+    a container from within its own contents refers to its copy as long as the container is copied
+    before its contents are (see _EARLY_COPY_ADDRESSES), and to the original otherwise.
+    """
+    if paths and not paths[0]:  # root_obj itself is found first
+        return overwrite_func(root_obj) if callable(overwrite_func) else overwrite_value
+    if not paths:
+        return root_obj
+    merged = {}  # id(container) -> (container, replacements, {step: [child, trie nodes]})
+    _merge_path_trie(
+        merged, root_obj, _build_path_trie(paths), overwrite_value, overwrite_func, member_index
+    )
+    revisits = list(revisits)
+    while revisits:
+        aliases, pending = [[], {}], []
+        for path, obj in revisits:
+            if id(obj) not in merged:
+                pending.append((path, obj))
+                continue
+            container, steps = root_obj, []
+            for step in path:
+                entry = merged.get(id(container))
+                if entry is not None and step in entry[1]:  # The reference itself is replaced
+                    break
+                steps.append(step)
+                container = _increment_obj_pointer(container, step, member_index)
+            else:
+                node = aliases
+                for step in steps:
+                    node = _trie_child(node, step)
+        if len(pending) == len(revisits):
+            break
+        _merge_path_trie(merged, root_obj, aliases, overwrite_value, overwrite_func, member_index)
+        revisits = pending
+
+    copies = {}  # id(container) -> copy
+    started = set()
+    stack = [(root_obj, False)]
+    while stack:
+        obj, ready = stack.pop()
+        _, replacements, nodes = merged[id(obj)]
+        if ready:
+            values = dict(replacements)
+            for child, (elem, _) in nodes.items():
+                values[child] = copies.get(id(elem), elem)
+            copies[id(obj)] = _copy_with(obj, values, copies.get(id(obj)))
+        elif id(obj) not in started:
+            started.add(id(obj))
+            if next(iter(nodes or replacements))[0] in _EARLY_COPY_ADDRESSES:
+                copies[id(obj)] = copy(obj)
+            stack.append((obj, True))
+            stack.extend((elem, False) for elem, _ in nodes.values())
+    return copies[id(root_obj)]
+
+
+def _merge_path_trie(
+    merged: dict[int, tuple[Any, dict, dict]],
+    root_obj: Any,
+    trie: list,
+    overwrite_value: Any = None,
+    overwrite_func: Optional[Callable[[Any], Any]] = None,
+    member_index: Optional[_MemberIndex] = None,
+) -> None:
+    """
+    Merge the nodes of trie (see _build_path_trie) that reach the same container into merged,
+    computing the replacement of each element to replace once (see _copy_along_paths).
+    """
+    stack = [(root_obj, trie)]
+    while stack:
+        obj, (writes, children) = stack.pop()
+        entry = merged.get(id(obj))
+        if entry is None:
+            entry = merged[id(obj)] = (obj, {}, {})
+        _, replacements, nodes = entry
+        for child, _ in writes:
+            if child in replacements:
+                continue
+            if callable(overwrite_func):
+                original = _increment_obj_pointer(obj, child, member_index)
+                replacements[child] = overwrite_func(original)
+            else:
+                replacements[child] = overwrite_value
+            nodes.pop(child, None)  # Paths below the element are dropped
+        for child, node in children.items():
+            if child in replacements:
+                continue
+            resolved = nodes.get(child)
+            if resolved is None:
+                elem = _increment_obj_pointer(obj, child, member_index)
+                resolved = nodes[child] = [elem, []]
+            resolved[1].append(node)
+            stack.append((resolved[0], node))
+
+
+def _copy_with(
+    obj: Any, replacements: dict[tuple[Address, Union[str, int]], Any], new: Any = None
+) -> Any:
+    """
+    Shallow copy obj with its elements at the steps of replacements replaced by their values.
+
+    For the address types of _EARLY_COPY_ADDRESSES, the values are written into new instead if it
+    is supplied (a shallow copy of obj).
+    """
+    entry_type = next(iter(replacements))[0]
+    if entry_type == Address.ATTR:
+        new = copy(obj) if new is None else new
+        for (_, name), value in replacements.items():
+            setattr(new, name, value)
+    elif entry_type in [Address.MUTABLE_MAPPING_KEY, Address.MUTABLE_SEQUENCE_IDX]:
+        new = copy(obj) if new is None else new
+        for (_, key), value in replacements.items():
+            new[key] = value
+    elif entry_type == Address.IMMUTABLE_MAPPING_KEY:
+        items = dict(obj)
+        items.update((key, value) for (_, key), value in replacements.items())
+        new = type(obj)(items)
+    elif entry_type == Address.IMMUTABLE_SEQUENCE_IDX:
+        items = list(obj)
+        for (_, idx), value in replacements.items():
+            items[idx] = value
+        try:
+            if isinstance(obj, str):
+                new = "".join(items)
+            elif hasattr(obj, "_fields"):  # namedtuple
+                new = obj._make(items)
+            else:
+                new = type(obj)(items)
+        except TypeError:  # e.g. range
+            raise TypeError(f"Cannot copy {type(obj).__name__} with replaced elements.") from None
+    elif entry_type in [Address.MUTABLE_SET_ID, Address.IMMUTABLE_SET_ID]:
+        new = type(obj)(replacements.get((entry_type, id(item)), item) for item in obj)
+    else:
+        raise TypeError(f"Cannot copy {type(obj).__name__} with replaced elements.")
+    return new
+
+
+def iter_elements(
+    root_obj: Any,
+    element_test: Callable[[Any], bool] = lambda x: True,
+    path_test: Callable[[Union[int, str]], bool] = lambda x: True,
+    memoize: bool = False,
+    unravel_strings: bool = False,
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+    structured_paths: bool = False,
+) -> Generator[tuple[Union[str, Path], Any], None, None]:
+    """
+    Lazily yield all elements within root_obj that satisfy element_test and path_test.
+
+    Elements are yielded in traversal order as soon as they are found, so the caller can stop
+    early without root_obj being explored any further.
+
+    :param root_obj: Root object to search
+    :param element_test: Callable to determine whether an element within root_obj is interesting
+    :param path_test: Callable to determine whether a path within root_obj is interesting
+    :param memoize: Whether or not to cache elements by id and only return unique elements.
+                Note that certain types are never cached (NoneType, Number, str, ByteString) due
+                to interning in CPython.
+    :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of root_obj that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           root_obj is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element, which supports len(),
+                           indexing and reversed() without copying the path.
+    :param structured_paths: Whether or not to yield Path objects instead of rendered path strings
+    :return: Generator of (concatenated address path, interesting object) tuples
+    """
+    traversal = _traverse(
+        root_obj,
+        element_test,
+        path_test,
+        memoize,
+        unravel_strings,
+        descend_test=descend_test,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        plan=None if query is None else _QueryPlan(query),
+        full_path_test=full_path_test,
+    )
+    if structured_paths:
+        for path, obj in traversal:
+            yield Path(path), obj
+    else:
+        for path, obj in traversal:
+            yield _render_path(path), obj
+
+
+async def aiter_elements(
+    root_obj: Any,
+    element_test: Callable[[Any], bool] = lambda x: True,
+    path_test: Callable[[Union[int, str]], bool] = lambda x: True,
+    memoize: bool = False,
+    unravel_strings: bool = False,
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+    structured_paths: bool = False,
+    chunk_size: int = 1000,
+) -> AsyncGenerator[tuple[Union[str, Path], Any], None]:
+    """
+    Asynchronously yield all elements within root_obj that satisfy element_test and path_test.
+
+    This is the asynchronous version of iter_elements. root_obj is explored chunk_size elements at
+    a time and control is handed back to the event loop between chunks, so that exploring a large
+    object does not block other tasks. Closing or cancelling the iteration stops the exploration.
+
+    :param root_obj: Root object to search
+    :param element_test: Callable to determine whether an element within root_obj is interesting
+    :param path_test: Callable to determine whether a path within root_obj is interesting
+    :param memoize: Whether or not to cache elements by id and only return unique elements.
+                Note that certain types are never cached (NoneType, Number, str, ByteString) due
+                to interning in CPython.
+    :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of root_obj that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           root_obj is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element, which supports len(),
+                           indexing and reversed() without copying the path.
+    :param structured_paths: Whether or not to yield Path objects instead of rendered path strings
+    :param chunk_size: Number of elements to visit between handing control back to the event loop
+    :return: Asynchronous generator of (concatenated address path, interesting object) tuples
+    """
+    traversal = _traverse(
+        root_obj,
+        element_test,
+        path_test,
+        memoize,
+        unravel_strings,
+        descend_test=descend_test,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        plan=None if query is None else _QueryPlan(query),
+        full_path_test=full_path_test,
+        chunk_size=chunk_size,
+    )
+    for path, obj in traversal:
+        if path is None:  # Pause between chunks
+            await asyncio.sleep(0)
+        else:
+            yield Path(path) if structured_paths else _render_path(path), obj
 
 
 def get_elements(
@@ -316,7 +1364,14 @@ def get_elements(
     path_test: Callable[[Union[int, str]], bool] = lambda x: True,
     memoize: bool = False,
     unravel_strings: bool = False,
-) -> dict[str, Any]:
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+    structured_paths: bool = False,
+) -> dict[Union[str, Path], Any]:
     """
     Get all elements within root_obj that satisfy element_test and path_test.
 
@@ -327,16 +1382,111 @@ def get_elements(
                 Note that certain types are never cached (NoneType, Number, str, ByteString) due
                 to interning in CPython.
     :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of root_obj that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           root_obj is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element, which supports len(),
+                           indexing and reversed() without copying the path.
+    :param structured_paths: Whether or not to key the result by Path objects instead of rendered
+                             path strings
     :return: Dict keyed by concatenated address path with values being the interesting objects
     """
-    paths = _get_paths(
+    return dict(
+        iter_elements(
+            root_obj,
+            element_test=element_test,
+            path_test=path_test,
+            memoize=memoize,
+            unravel_strings=unravel_strings,
+            descend_test=descend_test,
+            max_depth=max_depth,
+            max_nodes=max_nodes,
+            timeout=timeout,
+            query=query,
+            full_path_test=full_path_test,
+            structured_paths=structured_paths,
+        )
+    )
+
+
+def get_elements_at_paths(
+    root_obj: Any, paths: Iterable[Sequence[tuple[Address, Union[str, int]]]]
+) -> dict[Path, Any]:
+    """
+    Get the elements at the supplied paths within root_obj.
+
+    :param root_obj: Root object to search
+    :param paths: Paths (e.g. the keys returned by get_elements with structured_paths=True)
+    :return: Dict keyed by Path with values being the elements at each path
+    """
+    member_index = _MemberIndex()
+    return {Path(path): _get_element_at_path(root_obj, path, member_index) for path in paths}
+
+
+def get_aliases(
+    root_obj: Any,
+    element_test: Callable[[Any], bool] = lambda x: True,
+    path_test: Callable[[Union[int, str]], bool] = lambda x: True,
+    unravel_strings: bool = False,
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> dict[str, list[str]]:
+    """
+    Get the paths of all unique elements within root_obj that satisfy element_test and path_test,
+    along with every other path that refers to the same element.
+
+    Each element is explored only once (as with memoize=True), so the result grows with the number
+    of references within root_obj rather than with the number of paths through it. Aliases are only
+    recorded for the element itself: the aliases of its contents follow by replacing the canonical
+    path prefix with one of its alias paths.
+
+    :param root_obj: Root object to search
+    :param element_test: Callable to determine whether an element within root_obj is interesting
+    :param path_test: Callable to determine whether a path within root_obj is interesting
+    :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :return: Dict keyed by the concatenated address path at which each interesting element was
+             first found with values being the list of its other (alias) paths
+    """
+    aliases = {}
+    aliases_by_id = {}  # id(obj) -> alias list of an interesting element
+
+    def record_alias(path: _PathNode, obj: Any, cycle_path: Optional[_PathNode]) -> None:
+        alias_paths = aliases_by_id.get(id(obj))
+        if alias_paths is not None:
+            alias_paths.append(_render_path(path))
+
+    relevant_content = _traverse(
         root_obj,
         element_test=element_test,
         path_test=path_test,
-        memoize=memoize,
+        memoize=True,
         unravel_strings=unravel_strings,
+        descend_test=descend_test,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        on_revisit=record_alias,
     )
-    return _get_elements_from_paths(root_obj, paths)
+    for path, obj in relevant_content:
+        aliases[_render_path(path)] = aliases_by_id[id(obj)] = []
+    return aliases
 
 
 def overwrite_elements(
@@ -347,8 +1497,15 @@ def overwrite_elements(
     path_test: Callable[[Union[int, str]], bool] = lambda x: True,
     memoize: bool = False,
     unravel_strings: bool = False,
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
     silent: bool = False,
     raise_on_exception: bool = True,
+    single_pass: bool = False,
 ) -> None:
     """
     Overwrite all elements (in-place) within root_obj that satisfy element_test and path_test.
@@ -362,116 +1519,294 @@ def overwrite_elements(
                     Note that certain types are never cached (NoneType, Number, str, ByteString) due
                     to interning in CPython.
     :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of root_obj that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           root_obj is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element, which supports len(),
+                           indexing and reversed() without copying the path.
     :param silent: Whether or not to print address paths that fail
     :param raise_on_exception: Whether or not to raise on exceptions during overwrite or suppress
+    :param single_pass: Whether or not to overwrite each element as soon as it is found instead of
+                        collecting all paths first. Overwritten elements are not explored, so
+                        elements below them (in either the old or the new value) are not
+                        overwritten. Set members are overwritten once the search is over.
     :return: None
     """
-    paths = _get_paths(
+    member_index = _MemberIndex()
+    set_writes = []  # (parent, path) of set members found in a single pass
+
+    def overwrite_match(parent: Any, path: _PathNode, obj: Any) -> bool:
+        if parent is None:
+            raise IndexError("Cannot overwrite root_obj in-place.")
+        if path.step[0] == Address.MUTABLE_SET_ID:
+            # The set is still being iterated, so its members are replaced afterwards
+            set_writes.append((parent, path))
+            return True
+        try:
+            _overwrite_element(parent, path.step, overwrite_value, overwrite_func, member_index)
+        except TypeError as e:
+            _report_failed_overwrite(e, parent, path, silent, raise_on_exception, member_index)
+            return False
+        return True
+
+    traversal = _traverse(
         root_obj,
-        element_test=element_test,
-        path_test=path_test,
-        memoize=memoize,
-        unravel_strings=unravel_strings,
+        element_test,
+        path_test,
+        memoize,
+        unravel_strings,
+        descend_test=descend_test,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        plan=None if query is None else _QueryPlan(query),
+        full_path_test=full_path_test,
+        member_index=member_index,
+        on_match=overwrite_match if single_pass else None,
     )
+    if single_pass:
+        for _ in traversal:
+            pass
+        for parent, path in set_writes:
+            try:
+                _overwrite_element(parent, path.step, overwrite_value, overwrite_func, member_index)
+            except TypeError as e:
+                _report_failed_overwrite(e, parent, path, silent, raise_on_exception, member_index)
+        return
     _overwrite_elements_at_paths(
         root_obj,
-        paths=paths,
+        paths=[path for path, _ in traversal],
         overwrite_value=overwrite_value,
         overwrite_func=overwrite_func,
         silent=silent,
         raise_on_exception=raise_on_exception,
+        member_index=member_index,
     )
 
 
-def print_obj_tree(
+def overwrite_elements_at_paths(
     root_obj: Any,
+    paths: Iterable[Sequence[tuple[Address, Union[str, int]]]],
+    overwrite_value: Any = None,
+    overwrite_func: Optional[Callable[[Any], Any]] = None,
+    silent: bool = False,
+    raise_on_exception: bool = True,
+) -> None:
+    """
+    Overwrite the elements (in-place) at the supplied paths within root_obj.
+
+    :param root_obj: Root object to search
+    :param paths: Paths (e.g. the keys returned by get_elements with structured_paths=True)
+    :param overwrite_value: Value to overwrite
+    :param overwrite_func: Callable to act on element to overwrite (e.g. str)
+    :param silent: Whether or not to print address paths that fail
+    :param raise_on_exception: Whether or not to raise on exceptions during overwrite or suppress
+    :return: None
+    """
+    _overwrite_elements_at_paths(
+        root_obj,
+        list(paths),
+        overwrite_value=overwrite_value,
+        overwrite_func=overwrite_func,
+        silent=silent,
+        raise_on_exception=raise_on_exception,
+    )
+
+
+def transformed_copy(
+    root_obj: Any,
+    overwrite_value: Any = None,
+    overwrite_func: Optional[Callable[[Any], Any]] = None,
     element_test: Callable[[Any], bool] = lambda x: True,
     path_test: Callable[[Union[int, str]], bool] = lambda x: True,
     memoize: bool = False,
     unravel_strings: bool = False,
-    max: Optional[int] = None,
-) -> None:
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+) -> Any:
     """
-    Print the elements and paths of root_obj that satisfy element_test and path_test.
+    Copy root_obj with the elements that satisfy element_test and path_test replaced.
+
+    Unlike overwrite_elements and hot_swap, root_obj is left untouched. Only the containers along
+    the paths to the replaced elements are (shallowly) copied, including immutable ones such as
+    tuples, and everything else is shared with root_obj. A container reached along several paths
+    is copied once with the replacements found along all of them, and every reference to it that
+    was reached (including those not explored due to memoize) refers to its copy. References to a
+    copied container that were never reached (e.g. beyond max_depth or not accepted by
+    descend_test) and references to an immutable container (e.g. a tuple) from within its own
+    contents still refer to the original.
 
     :param root_obj: Root object to search
+    :param overwrite_value: Value to replace elements with
+    :param overwrite_func: Callable used to replace elements (e.g. str) instead of overwrite_value
     :param element_test: Callable to determine whether an element within root_obj is interesting
     :param path_test: Callable to determine whether a path within root_obj is interesting
     :param memoize: Whether or not to cache elements by id and only return unique elements.
                     Note that certain types are never cached (NoneType, Number, str, ByteString) due
                     to interning in CPython.
     :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
-    :param max: Maximum number of results to print
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of root_obj that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           root_obj is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element.
+    :return: Copy of root_obj (or root_obj itself if no element is replaced)
     """
-    relevant_content = get_elements(
+    member_index = _MemberIndex()
+    revisits = []
+
+    def record_revisit(path: _PathNode, obj: Any, cycle_path: Optional[_PathNode]) -> None:
+        revisits.append((path, obj))
+
+    traversal = _traverse(
         root_obj,
-        element_test=element_test,
-        path_test=path_test,
-        memoize=memoize,
-        unravel_strings=unravel_strings,
+        element_test,
+        path_test,
+        memoize,
+        unravel_strings,
+        descend_test=descend_test,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        member_index=member_index,
+        on_revisit=record_revisit,
+        plan=None if query is None else _QueryPlan(query),
+        full_path_test=full_path_test,
+    )
+    return _copy_along_paths(
+        root_obj,
+        [path for path, _ in traversal],
+        overwrite_value=overwrite_value,
+        overwrite_func=overwrite_func,
+        member_index=member_index,
+        revisits=revisits,
     )
-    idx = 0
-    for key, value in relevant_content.items():
-        if max is not None and idx >= max:
-            break
-        print(f"{key} -> {PrettyRepr.repr(value)}")
-        idx += 1
 
 
-@contextmanager
-def hot_swap(
+def print_obj_tree(
     root_obj: Any,
-    overwrite_value: Any = None,
-    overwrite_func: Optional[Callable[[Any], Any]] = None,
     element_test: Callable[[Any], bool] = lambda x: True,
     path_test: Callable[[Union[int, str]], bool] = lambda x: True,
     memoize: bool = False,
     unravel_strings: bool = False,
-    allow_mutable_set_mutations: bool = False,
-) -> Generator[None, None, None]:
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+    max: Optional[int] = None,
+) -> None:
     """
-    Generate a hot swapped object for manipulation that is restored upon close.
-
-    This is a context manager that safely overwrites an object with replacement values
-    and then restore them upon exit. This allows one to e.g. swap out all non-serializable
-    content with safe fillers, dump to JSON, and then restore the original objects.
+    Print the elements and paths of root_obj that satisfy element_test and path_test.
 
     :param root_obj: Root object to search
-    :param overwrite_value: Value to overwrite
-    :param overwrite_func: Callable used to overwrite (e.g. str) instead of overwrite_value
     :param element_test: Callable to determine whether an element within root_obj is interesting
     :param path_test: Callable to determine whether a path within root_obj is interesting
     :param memoize: Whether or not to cache elements by id and only return unique elements.
                     Note that certain types are never cached (NoneType, Number, str, ByteString) due
                     to interning in CPython.
     :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
-    :param allow_mutable_set_mutations: Whether or not to allow set content to be overwritten
-                                        (can be unsafe)
-    :return: Generator that yields None
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of root_obj that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           root_obj is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element, which supports len(),
+                           indexing and reversed() without copying the path.
+    :param max: Maximum number of results to print
     """
-    original_elem_paths = _get_paths(
+    last_cycle = [None, None]  # latest back-reference path and the ancestor it refers to
+
+    def record_cycle(path: _PathNode, obj: Any, cycle_path: Optional[_PathNode]) -> None:
+        if cycle_path is not None:
+            last_cycle[:] = path, cycle_path
+
+    relevant_content = _traverse(
         root_obj,
         element_test=element_test,
         path_test=path_test,
         memoize=memoize,
         unravel_strings=unravel_strings,
+        descend_test=descend_test,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        plan=None if query is None else _QueryPlan(query),
+        full_path_test=full_path_test,
+        on_revisit=record_cycle,
     )
+    for path, value in islice(relevant_content, max):
+        if last_cycle[0] is path:
+            print(f"{_render_path(path)} -> <cycle to {_render_path(last_cycle[1])}>")
+        else:
+            print(f"{_render_path(path)} -> {PrettyRepr.repr(value)}")
+
+
+def _build_swap_trie(paths: list[_PathNode], allow_mutable_set_mutations: bool = False) -> list:
+    """Build the trie of the paths to hot swap (see _build_path_trie)."""
     if not allow_mutable_set_mutations and any(
-        path[-1][0] == Address.MUTABLE_SET_ID for path in original_elem_paths
+        path[-1][0] == Address.MUTABLE_SET_ID for path in paths
     ):
         raise TypeError(
             "Cannot safely overwrite and revert mutable sets due to cardinality changes. "
             "Set allow_mutable_set_mutations=True to allow mutable set mutations."
         )
-    original_elems = _get_elements_from_paths(root_obj, original_elem_paths).values()
+    return _build_path_trie(paths)
+
+
+@contextmanager
+def _swapped(
+    root_obj: Any,
+    trie: list,
+    containers: dict[int, Any],
+    overwrite_value: Any = None,
+    overwrite_func: Optional[Callable[[Any], Any]] = None,
+    member_index: Optional[_MemberIndex] = None,
+) -> Generator[None, None, None]:
+    """
+    Overwrite the elements at the paths of trie within root_obj until close.
+
+    The elements are restored and the containers registered for the hot swap are released upon
+    close, without any interruption.
+    """
+    journal = []
     try:
         _overwrite_elements_at_paths(
             root_obj,
-            original_elem_paths,
+            [],
             overwrite_value=overwrite_value,
             overwrite_func=overwrite_func,
             silent=True,
             raise_on_exception=True,
+            member_index=member_index,
+            journal=journal,
+            trie=trie,
         )
         yield
     except Exception as e:
@@ -481,10 +1816,432 @@ def hot_swap(
         )
         raise e
     finally:
-        for path in original_elem_paths:
-            if path[-1][0] == Address.MUTABLE_SET_ID:
-                path[-1] = (Address.MUTABLE_SET_ID, id(overwrite_value))
-        for orig_path, orig_el in zip(original_elem_paths, original_elems):
-            _overwrite_elements_at_paths(
-                root_obj, [orig_path], orig_el, silent=True, raise_on_exception=True
+        try:
+            _undo_journal(journal, member_index)
+        finally:
+            _ACTIVE_SWAPS.release(containers)
+
+
+class _SwapRegistry:
+    """
+    Containers along the paths of the elements swapped by the active hot swaps of all threads.
+
+    A hot swap searches root_obj between begin_search and end_search, and then registers the
+    containers along its paths with acquire, which fails if another hot swap along any of these
+    containers started or ended during the search (the search may have found its replacement
+    values), after waiting for the ones still active to end. The containers are registered by id
+    until release, counting the nested hot swaps of their owner (see _get_owner).
+    """
+
+    def __init__(self) -> None:
+        self._changed = threading.Condition()
+        # id(container) -> [owner, number of hot swaps, container, thread id of the owner]
+        self._owners = {}
+        self._touched = {}  # id(container) -> epoch at which a hot swap along it started or ended
+        self._epoch = 0
+        self._searches = 0
+
+    def begin_search(self) -> int:
+        """Record the start of a search and return the current epoch."""
+        with self._changed:
+            self._searches += 1
+            return self._epoch
+
+    def end_search(self) -> None:
+        """Record the end of a search, forgetting the history once no search is left."""
+        with self._changed:
+            self._searches -= 1
+            if not self._searches:
+                self._touched.clear()
+
+    def _find_overlap(self, containers: dict[int, Any], owner: Any) -> Optional[list]:
+        """Find the entry of a container registered by another owner (the lock must be held)."""
+        for key in containers:
+            entry = self._owners.get(key)
+            if entry is not None and entry[0] != owner:
+                return entry
+        return None
+
+    def overlaps(self, containers: dict[int, Any]) -> bool:
+        """Whether or not any of containers is registered by another owner."""
+        with self._changed:
+            return self._find_overlap(containers, _get_owner()) is not None
+
+    def acquire(
+        self,
+        containers: dict[int, Any],
+        epoch: int,
+        deadline: Optional[float] = None,
+        blocking: bool = True,
+    ) -> Optional[dict[int, Any]]:
+        """
+        Register containers for the current owner, waiting for the overlapping hot swaps of other
+        owners to end until deadline (see monotonic). Returns None without registering them if the
+        search that began at epoch has to be repeated, or right away if blocking is False and
+        there are overlapping hot swaps.
+        """
+        owner, thread = _get_owner(), threading.get_ident()
+        with self._changed:
+            while True:
+                entry = self._find_overlap(containers, owner)
+                if entry is None:
+                    break
+                if not blocking:
+                    return None
+                if entry[3] == thread:
+                    # The other owner is a task of this thread, which cannot run while we wait
+                    raise RuntimeError("root_obj overlaps a hot swap active in another task.")
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise RuntimeError("root_obj overlaps a hot swap active in another thread.")
+                self._changed.wait(remaining)
+            if any(self._touched.get(key, epoch) > epoch for key in containers):
+                return None
+            self._epoch += 1
+            for key, container in containers.items():
+                entry = self._owners.get(key)
+                if entry is None:
+                    self._owners[key] = [owner, 1, container, thread]
+                else:
+                    entry[1] += 1
+                if self._searches > 1:
+                    self._touched[key] = self._epoch
+            return containers
+
+    def release(self, containers: dict[int, Any]) -> None:
+        """Unregister containers previously registered by acquire."""
+        with self._changed:
+            self._epoch += 1
+            for key in containers:
+                entry = self._owners[key]
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._owners[key]
+                if self._searches:
+                    self._touched[key] = self._epoch
+            self._changed.notify_all()
+
+
+_ACTIVE_SWAPS = _SwapRegistry()
+
+
+def _get_owner() -> Any:
+    """Get the asyncio task running in the current thread, or the thread's id if there is none."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:  # No event loop is running in this thread
+        task = None
+    return threading.get_ident() if task is None else task
+
+
+def _get_path_containers(
+    root_obj: Any, trie: list, member_index: Optional[_MemberIndex] = None
+) -> dict[int, Any]:
+    """Collect root_obj and the containers along the paths of trie (see _build_path_trie) by id."""
+    containers = {}
+    stack = [(root_obj, trie)]
+    while stack:
+        obj, (_, children) = stack.pop()
+        containers[id(obj)] = obj
+        for child, node in children.items():
+            stack.append((_increment_obj_pointer(obj, child, member_index), node))
+    return containers
+
+
+class HotSwapPlan:
+    """
+    Paths of the elements to swap found by compile_hot_swap within a prototype object.
+
+    Passing the plan to hot_swap swaps the elements at the same paths within another object of the
+    same shape without searching it. Only the elements along the paths are checked (each container
+    must still be explored the same way and hold the next element, descend_test must still accept
+    each container and element_test each element to swap), and the object is searched as usual if
+    any check fails. Elements found at other paths than in the prototype are not swapped, and paths
+    through sets are never reused since their steps refer to the members by id.
+    """
+
+    __slots__ = ("paths", "search", "_trie")
+
+    def __init__(self, paths: Optional[list[Path]], search: dict[str, Any]):
+        self.paths = paths  # None if the paths cannot be reused
+        self.search = search  # Keyword arguments used to search an object for elements to swap
+        self._trie = None if paths is None else _build_path_trie(paths)
+
+    def _matches(self, root_obj: Any) -> bool:
+        """Whether or not the elements to swap are found at the planned paths within root_obj."""
+        element_test = self.search["element_test"]
+        descend_test = self.search["descend_test"]
+        unravel_strings = self.search["unravel_strings"]
+        if descend_test is not None and not descend_test(root_obj, None):
+            return False
+        stack = [(root_obj, self._trie)]
+        while stack:
+            parent, (writes, children) = stack.pop()
+            handler = _get_handler(parent, unravel_strings)
+            if handler is None:
+                return False
+            for step, _ in writes:
+                obj = _get_child(parent, step, handler)
+                if obj is _MISSING or not element_test(obj):
+                    return False
+            for step, node in children.items():
+                obj = _get_child(parent, step, handler)
+                if obj is _MISSING or (descend_test is not None and not descend_test(obj, step)):
+                    return False
+                stack.append((obj, node))
+        return True
+
+
+def compile_hot_swap(
+    prototype: Any,
+    element_test: Callable[[Any], bool] = lambda x: True,
+    path_test: Callable[[Union[int, str]], bool] = lambda x: True,
+    memoize: bool = False,
+    unravel_strings: bool = False,
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+) -> HotSwapPlan:
+    """
+    Find the elements to swap within prototype so that hot_swap can reuse their paths.
+
+    :param prototype: Object shaped like the objects that will be hot swapped
+    :param element_test: Callable to determine whether an element within prototype is interesting
+    :param path_test: Callable to determine whether a path within prototype is interesting
+    :param memoize: Whether or not to cache elements by id and only return unique elements.
+                    Note that certain types are never cached (NoneType, Number, str, ByteString) due
+                    to interning in CPython.
+    :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
+    :param descend_test: Callable to determine whether the contents of an element within prototype
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for prototype). By default everything is explored.
+    :param max_depth: Maximum depth below prototype whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring prototype (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of prototype that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           prototype is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element.
+    :return: HotSwapPlan to pass to hot_swap
+    """
+    search = dict(
+        element_test=element_test,
+        path_test=path_test,
+        memoize=memoize,
+        unravel_strings=unravel_strings,
+        descend_test=descend_test,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        query=query,
+        full_path_test=full_path_test,
+    )
+    paths = [Path(path) for path in _get_paths(prototype, **search)]
+    if any(entry_type in _ID_ADDRESSES for path in paths for entry_type, _ in path):
+        paths = None
+    return HotSwapPlan(paths, search)
+
+
+@contextmanager
+def hot_swap(
+    root_obj: Any,
+    overwrite_value: Any = None,
+    overwrite_func: Optional[Callable[[Any], Any]] = None,
+    element_test: Callable[[Any], bool] = lambda x: True,
+    path_test: Callable[[Union[int, str]], bool] = lambda x: True,
+    memoize: bool = False,
+    unravel_strings: bool = False,
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+    allow_mutable_set_mutations: bool = False,
+    plan: Optional[HotSwapPlan] = None,
+    lock_timeout: Optional[float] = None,
+) -> Generator[None, None, None]:
+    """
+    Generate a hot swapped object for manipulation that is restored upon close.
+
+    This is a context manager that safely overwrites an object with replacement values
+    and then restore them upon exit. This allows one to e.g. swap out all non-serializable
+    content with safe fillers, dump to JSON, and then restore the original objects. Each
+    overwritten element is recorded along with its parent, so that restoring it does not require
+    searching root_obj again.
+
+    Hot swaps are safe to use from several threads. Two hot swaps overlap when the paths to their
+    elements share a container (root_obj included). A hot swap overlapping hot swaps active in
+    other threads waits for them to end and then searches root_obj again, so that it never takes
+    their replacement values for originals, while hot swaps that do not overlap run in parallel.
+    Nested hot swaps within the same thread overlap freely and are restored in reverse order.
+
+    :param root_obj: Root object to search
+    :param overwrite_value: Value to overwrite
+    :param overwrite_func: Callable used to overwrite (e.g. str) instead of overwrite_value
+    :param element_test: Callable to determine whether an element within root_obj is interesting
+    :param path_test: Callable to determine whether a path within root_obj is interesting
+    :param memoize: Whether or not to cache elements by id and only return unique elements.
+                    Note that certain types are never cached (NoneType, Number, str, ByteString) due
+                    to interning in CPython.
+    :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of root_obj that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           root_obj is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element, which supports len(),
+                           indexing and reversed() without copying the path.
+    :param allow_mutable_set_mutations: Whether or not to allow set content to be overwritten
+                                        (can be unsafe)
+    :param plan: HotSwapPlan compiled by compile_hot_swap from an object shaped like root_obj. Its
+                 paths are reused instead of searching root_obj if the elements at these paths
+                 still pass its tests, and the search arguments above are replaced by its own.
+    :param lock_timeout: Maximum number of seconds to wait for overlapping hot swaps in other
+                         threads to end (unlimited if None). A RuntimeError is raised once it
+                         runs out, so 0 raises as soon as an overlapping hot swap is found.
+    :return: Generator that yields None
+    """
+    if plan is None:
+        search = dict(
+            element_test=element_test,
+            path_test=path_test,
+            memoize=memoize,
+            unravel_strings=unravel_strings,
+            descend_test=descend_test,
+            max_depth=max_depth,
+            max_nodes=max_nodes,
+            timeout=timeout,
+            query=query,
+            full_path_test=full_path_test,
+        )
+        plan = HotSwapPlan(None, search)
+    deadline = None if lock_timeout is None else monotonic() + lock_timeout
+    containers = None
+    while containers is None:  # Search again if an overlapping swap ran during the search
+        epoch = _ACTIVE_SWAPS.begin_search()
+        try:
+            member_index = _MemberIndex()
+            if plan._trie is not None and plan._matches(root_obj):
+                trie = plan._trie
+            else:
+                paths = _get_paths(root_obj, member_index=member_index, **plan.search)
+                trie = _build_swap_trie(paths, allow_mutable_set_mutations)
+                del paths
+            containers = _ACTIVE_SWAPS.acquire(
+                _get_path_containers(root_obj, trie, member_index), epoch, deadline
             )
+        finally:
+            _ACTIVE_SWAPS.end_search()
+    with _swapped(root_obj, trie, containers, overwrite_value, overwrite_func, member_index):
+        yield
+
+
+@asynccontextmanager
+async def async_hot_swap(
+    root_obj: Any,
+    overwrite_value: Any = None,
+    overwrite_func: Optional[Callable[[Any], Any]] = None,
+    element_test: Callable[[Any], bool] = lambda x: True,
+    path_test: Callable[[Union[int, str]], bool] = lambda x: True,
+    memoize: bool = False,
+    unravel_strings: bool = False,
+    descend_test: Optional[Callable[[Any, Optional[tuple[Address, Union[str, int]]]], bool]] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    query: Optional[str] = None,
+    full_path_test: Optional[Callable[[Sequence[tuple[Address, Union[str, int]]]], bool]] = None,
+    allow_mutable_set_mutations: bool = False,
+    plan: Optional[HotSwapPlan] = None,
+    lock_timeout: Optional[float] = None,
+    chunk_size: int = 1000,
+) -> AsyncGenerator[None, None]:
+    """
+    Asynchronous context manager version of hot_swap.
+
+    root_obj is searched chunk_size elements at a time and control is handed back to the event
+    loop between chunks, and overlapping hot swaps are awaited rather than blocking the thread.
+    Hot swaps of concurrent tasks overlap just like those of different threads (see hot_swap).
+    The elements are then swapped and later restored without handing control back, so a hot swap
+    that is cancelled at any point leaves root_obj fully restored.
+
+    :param root_obj: Root object to search
+    :param overwrite_value: Value to overwrite
+    :param overwrite_func: Callable used to overwrite (e.g. str) instead of overwrite_value
+    :param element_test: Callable to determine whether an element within root_obj is interesting
+    :param path_test: Callable to determine whether a path within root_obj is interesting
+    :param memoize: Whether or not to cache elements by id and only return unique elements.
+                    Note that certain types are never cached (NoneType, Number, str, ByteString) due
+                    to interning in CPython.
+    :param unravel_strings: Whether or not to unpack str, bytes, and bytearray objects char by char
+    :param descend_test: Callable to determine whether the contents of an element within root_obj
+                         should be explored. It receives the element and the (Address, key) step
+                         leading to it (None for root_obj). By default everything is explored.
+    :param max_depth: Maximum depth below root_obj whose contents are explored (unlimited if None)
+    :param max_nodes: Maximum number of elements to visit (unlimited if None)
+    :param timeout: Maximum number of seconds to spend exploring root_obj (unlimited if None).
+                    A TraversalTruncatedWarning is issued whenever one of these budgets is hit.
+    :param query: Path query (e.g. ROOT['services'][*]..password) that the paths of interesting
+                  elements must match. Branches of root_obj that cannot match are not explored.
+    :param full_path_test: Callable to determine whether the full path to an element within
+                           root_obj is interesting. It receives a read-only view of the
+                           (Address, key) steps leading to the element.
+    :param allow_mutable_set_mutations: Whether or not to allow set content to be overwritten
+                                        (can be unsafe)
+    :param plan: HotSwapPlan compiled by compile_hot_swap from an object shaped like root_obj. Its
+                 paths are reused instead of searching root_obj if the elements at these paths
+                 still pass its tests, and the search arguments above are replaced by its own.
+    :param lock_timeout: Maximum number of seconds to wait for overlapping hot swaps in other
+                         threads or tasks to end (unlimited if None). A RuntimeError is raised
+                         once it runs out.
+    :param chunk_size: Number of elements to visit between handing control back to the event loop
+    :return: Asynchronous generator that yields None
+    """
+    if plan is None:
+        search = dict(
+            element_test=element_test,
+            path_test=path_test,
+            memoize=memoize,
+            unravel_strings=unravel_strings,
+            descend_test=descend_test,
+            max_depth=max_depth,
+            max_nodes=max_nodes,
+            timeout=timeout,
+            query=query,
+            full_path_test=full_path_test,
+        )
+        plan = HotSwapPlan(None, search)
+    deadline = None if lock_timeout is None else monotonic() + lock_timeout
+    containers = None
+    while containers is None:  # Search again if an overlapping swap ran during the search
+        epoch = _ACTIVE_SWAPS.begin_search()
+        try:
+            member_index = _MemberIndex()
+            if plan._trie is not None and plan._matches(root_obj):
+                trie = plan._trie
+            else:
+                paths = await _aget_paths(root_obj, chunk_size, member_index, **plan.search)
+                trie = _build_swap_trie(paths, allow_mutable_set_mutations)
+                del paths
+            found = _get_path_containers(root_obj, trie, member_index)
+            containers = _ACTIVE_SWAPS.acquire(found, epoch, blocking=False)
+        finally:
+            _ACTIVE_SWAPS.end_search()
+        while containers is None and _ACTIVE_SWAPS.overlaps(found):
+            if deadline is not None and monotonic() >= deadline:
+                raise RuntimeError("root_obj overlaps a hot swap active in another task or thread.")
+            await asyncio.sleep(_SWAP_POLL_INTERVAL)
+    with _swapped(root_obj, trie, containers, overwrite_value, overwrite_func, member_index):
+        yield
@@ -0,0 +1,99 @@
+"""pytest module for testing spelunk.graph"""
+import sys
+import pytest
+from spelunk.spelunk import Address, TraversalTruncatedWarning
+from spelunk.graph import ObjectGraph, get_graph, save_graph, load_graph
+
+
+class A:
+    """Dummy class for testing"""
+
+    def __init__(self, val):
+        self.val = val
+
+
+@pytest.fixture
+def shared_obj() -> dict:
+    config = A("debug")
+    return {"handlers": [config, config], "name": "root"}
+
+
+def test_get_graph(shared_obj: dict) -> None:
+    config = shared_obj["handlers"][0]
+    graph = get_graph(shared_obj)
+    assert isinstance(graph, ObjectGraph)
+    assert list(graph.node_ids) == [
+        id(shared_obj),
+        id(shared_obj["handlers"]),
+        id(config),
+        id("debug"),
+        id("root"),
+    ]
+    assert [graph.type_names[i] for i in graph.node_types] == ["dict", "list", "A", "str", "str"]
+    assert list(graph.node_sizes) == [
+        sys.getsizeof(obj) for obj in (shared_obj, shared_obj["handlers"], config, "debug", "root")
+    ]
+    assert graph.edges() == [
+        (0, 1, Address.MUTABLE_MAPPING_KEY, "handlers"),
+        (1, 2, Address.MUTABLE_SEQUENCE_IDX, 0),
+        (2, 3, Address.ATTR, "val"),
+        (1, 2, Address.MUTABLE_SEQUENCE_IDX, 1),
+        (0, 4, Address.MUTABLE_MAPPING_KEY, "name"),
+    ]
+
+
+def test_get_graph__shared_primitives_and_cycles() -> None:
+    obj = A([1000, 1000])
+    obj.val.append(obj)
+    graph = get_graph(obj, unravel_strings=True)
+    assert len(graph.node_ids) == 3
+    assert graph.edges() == [
+        (0, 1, Address.ATTR, "val"),
+        (1, 2, Address.MUTABLE_SEQUENCE_IDX, 0),
+        (1, 2, Address.MUTABLE_SEQUENCE_IDX, 1),
+        (1, 0, Address.MUTABLE_SEQUENCE_IDX, 2),
+    ]
+    assert graph.keys == ["val", 0, 1, 2]
+
+    text = "ab"
+    graph = get_graph([text, text], unravel_strings=True)
+    assert [graph.type_names[i] for i in graph.node_types] == ["list", "str", "str", "str"]
+    assert len(graph.edges()) == 4
+    # Each key is stored once, and equal keys of different types are kept apart
+    graph = get_graph([[0, 0], {1.0: 0}])
+    assert graph.keys == [0, 1, 1.0]
+    assert [type(key) for key in graph.keys] == [int, int, float]
+
+
+def test_get_graph__budget() -> None:
+    with pytest.warns(TraversalTruncatedWarning):
+        graph = get_graph([[1], [2]], max_depth=1)
+    assert len(graph.node_ids) == 3
+    assert len(graph.edge_parents) == 2
+
+
+def test_save_graph__load_graph(tmp_path, shared_obj: dict) -> None:
+    graph = get_graph({**shared_obj, ("tuple", "key"): None})
+    file = tmp_path / "graph.bin"
+    save_graph(graph, file)
+    loaded = load_graph(file)
+    for name in ObjectGraph._fields:
+        if name in ("type_names", "keys"):
+            continue
+        column = getattr(loaded, name)
+        assert isinstance(column, memoryview)
+        assert column.tolist() == getattr(graph, name).tolist()
+    assert loaded.type_names == graph.type_names
+    assert loaded.keys == graph.keys[:-1] + [repr(("tuple", "key"))]
+    assert loaded.edges()[0] == (0, 1, Address.MUTABLE_MAPPING_KEY, "handlers")
+
+    # A loaded graph can be saved again
+    save_graph(loaded, tmp_path / "copy.bin")
+    assert (tmp_path / "copy.bin").read_bytes() == file.read_bytes()
+
+
+def test_load_graph__invalid_file(tmp_path) -> None:
+    file = tmp_path / "graph.bin"
+    file.write_bytes(b"not a graph")
+    with pytest.raises(ValueError):
+        load_graph(file)
@@ -1,25 +1,55 @@
 """pytest module for testing spelunk"""
+import asyncio
+import gc
+import sys
+import threading
+import warnings
+import weakref
 import pytest
 from _pytest.capture import CaptureFixture
-from collections.abc import Collection, ValuesView, KeysView, ItemsView
-from collections import deque, OrderedDict, defaultdict, Counter, namedtuple
+from collections.abc import Collection, ValuesView, KeysView, ItemsView, Mapping
+from collections import deque, OrderedDict, defaultdict, Counter, namedtuple, ChainMap
 from typing import Union, Any
 from types import MappingProxyType
 from copy import copy
+import spelunk.spelunk
 from spelunk.spelunk import (
     Address,
+    _PathNode,
+    Path,
+    _MemberIndex,
+    _MISSING,
+    _QueryPlan,
     _get_paths,
-    _get_paths_helper,
+    _traverse,
+    _get_handler,
+    _CLASS_INFO,
+    register_handler,
+    _REGISTERED_HANDLERS,
     _collect_all_attrs,
+    _get_slot_names,
+    _SLOT_NAMES,
     _increment_path,
+    _render_path,
     _increment_obj_pointer,
     _get_elements_from_paths,
     _overwrite_element,
     _overwrite_elements_at_paths,
+    _undo_journal,
+    _ACTIVE_SWAPS,
     print_obj_tree,
     get_elements,
+    get_aliases,
+    get_elements_at_paths,
+    iter_elements,
+    aiter_elements,
     overwrite_elements,
+    overwrite_elements_at_paths,
+    transformed_copy,
     hot_swap,
+    async_hot_swap,
+    compile_hot_swap,
+    TraversalTruncatedWarning,
 )
 
 PrimTypes = Union[str, bytes, bytearray, int, float, complex, bool, None]
@@ -837,19 +867,10 @@ def test_get_paths__unravel_bytearray(unravel: bool) -> None:
     assert _get_paths(s, unravel_strings=unravel) == correct
 
 
-def test_get_paths_helper() -> None:
+def test_traverse() -> None:
     d = D()
-    output = []
-    _get_paths_helper(
-        d,
-        element_test=lambda x: True,
-        path_test=lambda x: True,
-        paths=output,
-        current_path=None,
-        memo=None,
-        memoize=False,
-    )
-    assert output == [
+    traversal = _traverse(d, element_test=lambda x: True, path_test=lambda x: True)
+    assert [path for path, _ in traversal] == [
         [],
         [(Address.ATTR, "__dict__")],
         [(Address.ATTR, "val2")],
@@ -857,12 +878,372 @@ def test_get_paths_helper() -> None:
     ]
 
 
+def test_traverse__yields_objects(obj_2: dict[str, Any]) -> None:
+    traversal = _traverse(
+        obj_2, element_test=lambda x: isinstance(x, int), path_test=lambda x: True
+    )
+    assert [obj for _, obj in traversal] == [1, 2, 4]
+
+
+@pytest.mark.parametrize("memoize", [True, False])
+def test_get_paths__deeper_than_recursion_limit(memoize: bool) -> None:
+    depth = 10 * sys.getrecursionlimit()
+    nested = []
+    for _ in range(depth):
+        nested = [nested]
+    paths = _get_paths(nested, element_test=lambda x: x == [], memoize=memoize)
+    assert paths == [[(Address.MUTABLE_SEQUENCE_IDX, 0)] * depth]
+
+
+def test_get_paths__shared_prefixes(obj_3: dict[str, Any]) -> None:
+    paths = _get_paths(obj_3, element_test=lambda x: isinstance(x, int))
+    key1_val_0, key1_val_1 = paths[:2]
+    assert key1_val_0.parent is key1_val_1.parent
+    assert key1_val_0[:-1] is key1_val_0.parent
+    assert key1_val_0[-1] == (Address.MUTABLE_SEQUENCE_IDX, 0)
+
+
+def test_path_node() -> None:
+    root = _PathNode()
+    child = _PathNode(root, (Address.MUTABLE_MAPPING_KEY, "key"))
+    grandchild = _PathNode(child, (Address.MUTABLE_SEQUENCE_IDX, 0))
+    assert len(root) == 0
+    assert len(grandchild) == 2
+    assert root == []
+    assert grandchild == [(Address.MUTABLE_MAPPING_KEY, "key"), (Address.MUTABLE_SEQUENCE_IDX, 0)]
+    assert grandchild == _PathNode(
+        _PathNode(_PathNode(), (Address.MUTABLE_MAPPING_KEY, "key")),
+        (Address.MUTABLE_SEQUENCE_IDX, 0),
+    )
+    assert grandchild != child
+    assert grandchild[0] == (Address.MUTABLE_MAPPING_KEY, "key")
+    assert grandchild[:-1] is child
+    assert root[:-1] == []
+    assert list(grandchild) == grandchild.steps()
+    assert repr(child) == repr([(Address.MUTABLE_MAPPING_KEY, "key")])
+
+
+def test_path_node__view() -> None:
+    grandchild = _PathNode(
+        _PathNode(_PathNode(), (Address.MUTABLE_MAPPING_KEY, "key")),
+        (Address.MUTABLE_SEQUENCE_IDX, 0),
+    )
+    assert grandchild[1] == grandchild[-1] == (Address.MUTABLE_SEQUENCE_IDX, 0)
+    assert grandchild[-2] == (Address.MUTABLE_MAPPING_KEY, "key")
+    assert list(reversed(grandchild)) == grandchild.steps()[::-1]
+    assert list(reversed(_PathNode())) == []
+    for idx in [2, -3]:
+        with pytest.raises(IndexError):
+            grandchild[idx]
+    with pytest.raises(IndexError):
+        _PathNode()[-1]
+
+
+@pytest.mark.parametrize("memoize", [True, False])
+def test_get_paths__descend_test(obj_2: dict[str, Any], memoize: bool) -> None:
+    explored = []
+    paths = _get_paths(
+        obj_2,
+        element_test=lambda x: isinstance(x, (int, A)),
+        memoize=memoize,
+        descend_test=lambda x, step: not explored.append(step) and not isinstance(x, tuple),
+    )
+    assert paths == [
+        [(Address.MUTABLE_MAPPING_KEY, "key"), (Address.MUTABLE_SEQUENCE_IDX, 0)],
+        [
+            (Address.MUTABLE_MAPPING_KEY, "key"),
+            (Address.MUTABLE_SEQUENCE_IDX, 2),
+            (Address.MUTABLE_SEQUENCE_IDX, 0),
+        ],
+        [
+            (Address.MUTABLE_MAPPING_KEY, "key"),
+            (Address.MUTABLE_SEQUENCE_IDX, 2),
+            (Address.MUTABLE_SEQUENCE_IDX, 0),
+            (Address.ATTR, "val"),
+        ],
+    ]
+    # Only elements with contents are offered for exploration
+    assert explored == [
+        None,
+        (Address.MUTABLE_MAPPING_KEY, "key"),
+        (Address.MUTABLE_SEQUENCE_IDX, 1),
+        (Address.MUTABLE_SEQUENCE_IDX, 2),
+        (Address.MUTABLE_SEQUENCE_IDX, 0),
+    ]
+
+
+def test_get_paths__descend_test_root(obj_2: dict[str, Any]) -> None:
+    assert _get_paths(obj_2, descend_test=lambda x, step: False) == [[]]
+
+
+def test_get_paths__max_depth(nested_list: list[list[list[list]]]) -> None:
+    with pytest.warns(TraversalTruncatedWarning, match="max_depth=2"):
+        paths = _get_paths(nested_list, max_depth=2)
+    assert paths == [
+        [],
+        [(Address.MUTABLE_SEQUENCE_IDX, 0)],
+        [(Address.MUTABLE_SEQUENCE_IDX, 0), (Address.MUTABLE_SEQUENCE_IDX, 0)],
+    ]
+
+
+def test_get_paths__max_depth_not_reached(
+    recwarn: pytest.WarningsRecorder, nested_list: list[list[list[list]]]
+) -> None:
+    assert len(_get_paths(nested_list, max_depth=3)) == 4
+    assert len(recwarn) == 0
+
+
+def test_get_paths__max_nodes(obj_2: dict[str, Any]) -> None:
+    with pytest.warns(TraversalTruncatedWarning, match=r"Stopped before ROOT\['key'\]\[1\]"):
+        paths = _get_paths(obj_2, max_nodes=3)
+    assert paths == [
+        [],
+        [(Address.MUTABLE_MAPPING_KEY, "key")],
+        [(Address.MUTABLE_MAPPING_KEY, "key"), (Address.MUTABLE_SEQUENCE_IDX, 0)],
+    ]
+
+
+def test_get_paths__timeout(obj_2: dict[str, Any]) -> None:
+    with pytest.warns(TraversalTruncatedWarning, match="timeout"):
+        assert _get_paths(obj_2, timeout=0) == []
+
+
+def test_get_paths__timeout_coarse_clock(
+    obj_2: dict[str, Any], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # The clock does not advance between the start of the walk and the first check
+    monkeypatch.setattr(spelunk.spelunk, "monotonic", lambda: 100.0)
+    with pytest.warns(TraversalTruncatedWarning, match="timeout"):
+        assert _get_paths(obj_2, timeout=0) == []
+    assert _get_paths(obj_2, path_test=lambda x: x == "key", timeout=1) == _get_paths(
+        obj_2, path_test=lambda x: x == "key"
+    )
+
+
+def test_get_paths__memoize_keeps_temporaries_alive() -> None:
+    class Temporary:
+        """Dummy class that can be weakly referenced"""
+
+    class Fresh:
+        """Dummy class whose attributes are new objects on every access"""
+
+        __slots__ = ("first", "second", "third")
+
+        def __getattribute__(self, name: str) -> Any:
+            if name in ("first", "second", "third"):
+                return Temporary()
+            return super().__getattribute__(name)
+
+    refs = []
+
+    def element_test(x: Any) -> bool:
+        if isinstance(x, Temporary):
+            refs.append(weakref.ref(x))
+            # A freed temporary could have its id reused by the next one
+            assert all(ref() is not None for ref in refs)
+            return True
+        return False
+
+    paths = _get_paths(Fresh(), element_test=element_test, memoize=True)
+    assert paths == [
+        [(Address.ATTR, "first")],
+        [(Address.ATTR, "second")],
+        [(Address.ATTR, "third")],
+    ]
+
+
+def test_traverse__on_revisit() -> None:
+    shared = A(None)
+    node = A([shared, shared])
+    node.val.append(node)
+    revisits = []
+    traversal = _traverse(
+        node,
+        element_test=lambda x: True,
+        path_test=lambda x: True,
+        memoize=True,
+        on_revisit=lambda path, obj, cycle: revisits.append((path, obj, cycle)),
+    )
+    assert len(list(traversal)) == 4
+    assert revisits == [
+        ([(Address.ATTR, "val"), (Address.MUTABLE_SEQUENCE_IDX, 1)], shared, None),
+        ([(Address.ATTR, "val"), (Address.MUTABLE_SEQUENCE_IDX, 2)], node, []),
+    ]
+
+
+def test_traverse__cycles_without_memoize() -> None:
+    shared = A(None)
+    node = A([shared, shared])
+    node.val.append(node)
+    revisits = []
+    traversal = _traverse(
+        node,
+        element_test=lambda x: True,
+        path_test=lambda x: True,
+        on_revisit=lambda path, obj, cycle: revisits.append((path, obj, cycle)),
+    )
+    # Shared elements are still explored on every path; back-references are visited once
+    assert [obj for _, obj in traversal] == [node, node.val, shared, None, shared, None, node]
+    assert revisits == [([(Address.ATTR, "val"), (Address.MUTABLE_SEQUENCE_IDX, 2)], node, [])]
+
+
+def test_get_elements__doubly_linked_list() -> None:
+    class Link:
+        def __init__(self, val):
+            self.val = val
+            self.prev = None
+            self.next = None
+
+    head = Link(1)
+    head.next = Link(2)
+    head.next.prev = head
+    head.next.next = Link(3)
+    head.next.next.prev = head.next
+    elements = get_elements(head, element_test=lambda x: isinstance(x, Link))
+    assert elements == {
+        "ROOT": head,
+        "ROOT.next": head.next,
+        "ROOT.next.prev": head,
+        "ROOT.next.next": head.next.next,
+        "ROOT.next.next.prev": head.next,
+    }
+
+
+def test_get_handler__atomic() -> None:
+    assert _get_handler("string") is None
+    assert _get_handler(1) is None
+    handler = _get_handler("s", unravel_strings=True)
+    assert list(handler.children("s")) == []
+    handler = _get_handler("st", unravel_strings=True)
+    assert handler.address == Address.IMMUTABLE_SEQUENCE_IDX
+    assert list(handler.children("st")) == [(0, "s"), (1, "t")]
+
+
+def test_get_handler__mapping() -> None:
+    handler = _get_handler({"key": 1})
+    assert handler.address == Address.MUTABLE_MAPPING_KEY
+    assert list(handler.children({"key": 1})) == [("key", 1)]
+
+
+def test_get_handler__mapping_single_pass() -> None:
+    class CountingMapping(Mapping):
+        """Dummy mapping counting lookups"""
+
+        def __init__(self, data: dict):
+            self.data = data
+            self.lookups = 0
+
+        def __getitem__(self, key: Any) -> Any:
+            self.lookups += 1
+            return self.data[key]
+
+        def get(self, key: Any, default: Any = None) -> Any:
+            # Like ChainMap, use a membership test followed by a lookup
+            self.lookups += 1
+            return self[key] if key in self.data else default
+
+        def __iter__(self):
+            return iter(self.data)
+
+        def __len__(self) -> int:
+            return len(self.data)
+
+    obj = CountingMapping({"a": 1, "b": 2})
+    handler = _get_handler(obj)
+    assert handler.address == Address.IMMUTABLE_MAPPING_KEY
+    assert list(handler.children(obj)) == [("a", 1), ("b", 2)]
+    assert obj.lookups == 2
+
+
+def test_get_paths__chain_map() -> None:
+    obj = ChainMap({"a": 1}, {"a": 2, "b": 3})
+    assert get_elements(obj, element_test=lambda x: isinstance(x, int)) == {
+        "ROOT['a']": 1,
+        "ROOT['b']": 3,
+    }
+
+
+def test_get_handler__str_subclass_attrs() -> None:
+    class Tagged(str):
+        """Dummy str subclass with attributes"""
+
+    tagged = Tagged("ab")
+    tagged.tag = "tag"
+    handler = _get_handler(tagged)
+    assert handler.address == Address.ATTR
+    assert list(handler.children(tagged)) == [("tag", "tag")]
+    handler = _get_handler(tagged, unravel_strings=True)
+    assert handler.address == Address.IMMUTABLE_SEQUENCE_IDX
+    assert list(handler.children(tagged)) == [(0, "a"), (1, "b")]
+
+
+def test_class_info_is_cached_weakly() -> None:
+    cls = type("Dynamic", (), {})
+    _get_handler(cls())
+    key = id(cls)
+    assert key in _CLASS_INFO
+    del cls
+    gc.collect()
+    assert key not in _CLASS_INFO
+
+
+def test_register_handler() -> None:
+    class Pair:
+        """Dummy class exposing its contents through a method"""
+
+        def __init__(self, first: Any, second: Any):
+            self._items = {"first": first, "second": second}
+
+        def get(self, key: str, default: Any = None) -> Any:
+            return self._items.get(key, default)
+
+    class SubPair(Pair):
+        """Dummy subclass of Pair"""
+
+    class Opaque:
+        """Dummy class that should never be explored"""
+
+        def __init__(self):
+            self.val = 1
+
+    try:
+        register_handler(Pair, Address.IMMUTABLE_MAPPING_KEY, lambda pair: pair._items.items())
+        register_handler(Opaque, None)
+        obj = SubPair(1, Opaque())
+        assert get_elements(obj) == {
+            "ROOT": obj,
+            "ROOT['first']": 1,
+            "ROOT['second']": obj.get("second"),
+        }
+        assert _get_elements_from_paths(obj, _get_paths(obj)) == get_elements(obj)
+        with pytest.raises(TypeError):
+            register_handler(Pair, Address.ATTR)
+    finally:
+        _REGISTERED_HANDLERS.clear()
+        _CLASS_INFO.clear()
+
+
 def test_collect_all_attrs() -> None:
     d = D()
     d.other = "other"
     assert _collect_all_attrs(d) == ["other", "__dict__", "val2", "val"]
 
 
+def test_collect_all_attrs__slots_only() -> None:
+    c = C()
+    assert _collect_all_attrs(c) == ["val2", "val"]
+
+
+def test_get_slot_names() -> None:
+    class E(D):
+        """Dummy class with a single string as __slots__"""
+
+        __slots__ = "val4"
+
+    assert _get_slot_names(E) == ("val4", "__dict__", "val2", "val")
+    assert _SLOT_NAMES[id(E)][1] is _get_slot_names(E)
+
+
 def test_increment_path__attr() -> None:
     assert _increment_path("root_obj", (Address.ATTR, "attr")) == "root_obj.attr"
 
@@ -898,6 +1279,48 @@ def test_increment_path__values_view() -> None:
     )
 
 
+def test_render_path() -> None:
+    path = [(Address.MUTABLE_MAPPING_KEY, "key"), (Address.IMMUTABLE_SEQUENCE_IDX, 0)]
+    assert _render_path(path) == "ROOT['key'][0]"
+    assert _render_path(path, root_name="obj") == "obj['key'][0]"
+    assert _render_path([]) == "ROOT"
+
+
+def test_path() -> None:
+    steps = [(Address.MUTABLE_MAPPING_KEY, "key"), (Address.MUTABLE_SEQUENCE_IDX, 0)]
+    path = Path(steps)
+    assert path.steps == tuple(steps)
+    assert path == steps
+    assert path == Path(_PathNode(_PathNode(_PathNode(), steps[0]), steps[1]))
+    assert path != Path([(Address.MUTABLE_MAPPING_KEY, "key"), (Address.MUTABLE_SEQUENCE_IDX, 1)])
+    assert path != "ROOT['key'][0]"
+    assert hash(path) == hash(Path(steps)) == hash(tuple(steps))
+    assert {path: 1}[Path(steps)] == 1
+    assert len(path) == 2
+    assert list(path) == steps
+    assert path[-1] == steps[-1]
+    assert path[:-1] == Path(steps[:1])
+    assert isinstance(path[:-1], Path)
+    assert str(path) == _render_path(path) == "ROOT['key'][0]"
+    assert str(Path()) == "ROOT"
+    assert repr(path) == f"Path({tuple(steps)!r})"
+    assert Path(path).steps is path.steps
+
+
+def test_render_path__path_node_cache() -> None:
+    parent = _PathNode(_PathNode(), (Address.MUTABLE_MAPPING_KEY, "key"))
+    first = _PathNode(parent, (Address.MUTABLE_SEQUENCE_IDX, 0))
+    second = _PathNode(parent, (Address.ATTR, "val"))
+    assert _render_path(first) == "ROOT['key'][0]"
+    assert parent.rendered == "ROOT['key']"
+    # Siblings only render their final step on top of the cached prefix
+    parent.rendered = "CACHED"
+    assert _render_path(second) == "CACHED.val"
+    assert _render_path(first) == "ROOT['key'][0]"
+    assert _render_path(second, root_name="obj") == "obj['key'].val"
+    assert _render_path(_PathNode()) == "ROOT"
+
+
 def test_increment_obj_pointer__attr() -> None:
     a = A(val="test_val")
     assert _increment_obj_pointer(a, (Address.ATTR, "val")) == a.val
@@ -941,6 +1364,54 @@ def test_increment_obj_pointer__values_view() -> None:
     assert _increment_obj_pointer(d.values(), (Address.VALUES_VIEW_ID, id(item))) == "test_val"
 
 
+def test_increment_obj_pointer__member_index() -> None:
+    items = [f"item{i}" for i in range(3)]
+    a = set(items)
+    index = _MemberIndex()
+    for item in items:
+        assert _increment_obj_pointer(a, (Address.MUTABLE_SET_ID, id(item)), index) is item
+    assert _increment_obj_pointer(a, (Address.MUTABLE_SET_ID, id(a)), index) is None
+
+
+def test_member_index() -> None:
+    first, second = "first", "second"
+    a = {first, second}
+    index = _MemberIndex()
+    index.record(a, first)
+    assert index.lookup(a, id(first)) is first
+    assert index.lookup(a, id(second)) is second
+    assert index.lookup(a, id(None)) is _MISSING
+    a.remove(first)
+    a.add(None)
+    index.replace(a, first, None)
+    assert index.lookup(a, id(None)) is None
+    assert index.lookup(a, id(first)) is _MISSING
+
+
+def test_traverse__member_index() -> None:
+    first, second = "first", "second"
+    a = frozenset((first, second))
+    index = _MemberIndex()
+    for _ in _traverse(a, lambda x: True, lambda x: True, member_index=index):
+        pass
+    # Members are recorded during traversal, so no scan of the container is needed for lookups
+    assert index._containers[id(a)][1] == {id(first): first, id(second): second}
+    assert index.lookup(a, id(first)) is first
+
+
+def test_overwrite_element__mutable_set_member_index() -> None:
+    num = 1
+    obj = {num, 2}
+    index = _MemberIndex()
+    _overwrite_element(
+        obj, (Address.MUTABLE_SET_ID, id(num)), overwrite_func=str, member_index=index
+    )
+    assert obj == {"1", 2}
+    assert index.lookup(obj, id(num)) is _MISSING
+    _overwrite_element(obj, (Address.MUTABLE_SET_ID, id(num)), None, member_index=index)
+    assert obj == {"1", 2}
+
+
 @pytest.mark.parametrize("memoize", [True, False])
 def test_get_objs_from_paths(obj_1: A, memoize: bool) -> None:
     correct = {
@@ -1118,6 +1589,93 @@ def test_overwrite_elements_at_paths_func(obj_1: A) -> None:
     assert obj_1.also.val == "33"
 
 
+def test_overwrite_elements_at_paths__batched() -> None:
+    obj = {"a": {"b": [list(range(5)), {"x": 1, "y": 2}, [0, 1, 2]]}}
+    paths = _get_paths(obj, element_test=lambda x: isinstance(x, int))
+    # Plain step lists share the trie with the traversal's paths
+    paths += [[(Address.MUTABLE_MAPPING_KEY, "a"), (Address.MUTABLE_MAPPING_KEY, "c")]]
+    _overwrite_elements_at_paths(obj, paths[::2] + paths[1::2], overwrite_func=str)
+    assert obj == {
+        "a": {"b": [["0", "1", "2", "3", "4"], {"x": "1", "y": "2"}, ["0", "1", "2"]], "c": "None"}
+    }
+    obj = [0, 1, 2, 3]
+    _overwrite_elements_at_paths(obj, [[(Address.MUTABLE_SEQUENCE_IDX, i)] for i in (3, 0)])
+    assert obj == [None, 1, 2, None]
+    with pytest.raises(IndexError):
+        _overwrite_elements_at_paths(obj, [[]])
+
+
+def test_overwrite_elements_at_paths__batched_duplicates() -> None:
+    obj = {"a": [0, 0]}
+    paths = [
+        [(Address.MUTABLE_MAPPING_KEY, "a"), (Address.MUTABLE_SEQUENCE_IDX, 0)],
+        [(Address.MUTABLE_MAPPING_KEY, "a"), (Address.MUTABLE_SEQUENCE_IDX, 0)],
+        [(Address.MUTABLE_MAPPING_KEY, "b")],
+        [(Address.MUTABLE_MAPPING_KEY, "b")],
+    ]
+    _overwrite_elements_at_paths(obj, paths, overwrite_func=lambda x: (x or 0) + 1)
+    assert obj == {"a": [2, 0], "b": 2}
+
+
+def test_overwrite_elements_at_paths__batched_subclasses() -> None:
+    writes = []
+
+    class LoggedList(list):
+        def __setitem__(self, key, value):
+            writes.append(key)
+            super().__setitem__(key, value)
+
+    class LoggedDict(dict):
+        def __setitem__(self, key, value):
+            writes.append(key)
+            super().__setitem__(key, value)
+
+    obj = [LoggedList([1, 2]), LoggedDict(x=1, y=2)]
+    _overwrite_elements_at_paths(obj, _get_paths(obj, element_test=lambda x: isinstance(x, int)))
+    assert obj == [[None, None], {"x": None, "y": None}]
+    assert writes == [0, 1, "x", "y"]
+
+
+def test_overwrite_elements_at_paths__batched_errors(capsys: CaptureFixture) -> None:
+    obj = {"a": 1, "b": "2", "c": 3}
+
+    def overwrite_func(x: Any) -> Any:
+        if isinstance(x, str):
+            raise TypeError(x)
+        return -x
+
+    paths = _get_paths(obj, path_test=lambda x: x != "")
+    _overwrite_elements_at_paths(
+        obj, paths, overwrite_func=overwrite_func, raise_on_exception=False
+    )
+    assert obj == {"a": -1, "b": "2", "c": -3}
+    assert capsys.readouterr().out == "Failed to overwrite 2 at ROOT['b'].\n"
+    with pytest.raises(TypeError):
+        _overwrite_elements_at_paths(obj, paths, overwrite_func=overwrite_func, silent=True)
+    # As when writing one element at a time, the elements before the failure were written
+    assert obj == {"a": 1, "b": "2", "c": -3}
+
+    obj = [1, "x", 3]
+    with pytest.raises(TypeError):
+        overwrite_elements(
+            obj,
+            overwrite_func=lambda x: x * 10 if x != "x" else x + 1,
+            path_test=lambda x: x != "",
+            silent=True,
+        )
+    assert obj == [10, "x", 3]
+
+    def fail_on_3(x: int) -> int:
+        if x == 3:
+            raise ValueError(x)
+        return -x
+
+    obj = [1, 2, 3, 4]
+    with pytest.raises(ValueError):
+        overwrite_elements(obj, overwrite_func=fail_on_3, path_test=lambda x: x != "")
+    assert obj == [-1, -2, 3, 4]
+
+
 @pytest.mark.parametrize("memoize", [True, False])
 def test_overwrite_elements_at_paths__raise_type_error(memoize: bool) -> None:
     obj = {1}
@@ -1130,7 +1688,7 @@ def test_overwrite_elements_at_paths__raise_type_error(memoize: bool) -> None:
 def test_overwrite_elements_at_paths__raise_value_error(memoize: bool) -> None:
     obj = (1,)
     paths = _get_paths(obj, element_test=lambda x: isinstance(x, int), memoize=memoize)
-    paths[0][0] = ("bad_value", paths[0][0][1])
+    paths = [[("bad_value", paths[0][0][1])]]
     with pytest.raises(ValueError):
         _overwrite_elements_at_paths(obj_1, paths, overwrite_value=None)
 
@@ -1147,12 +1705,202 @@ def test_get_elements__by_element(obj_1: A, memoize: bool) -> None:
     )
 
 
+def test_get_elements__returns_traversed_objects() -> None:
+    class Fresh:
+        """Dummy class whose attribute is a new object on every access"""
+
+        __slots__ = ("val",)
+
+        def __getattribute__(self, name: str) -> Any:
+            if name == "val":
+                return [name]
+            return super().__getattribute__(name)
+
+    seen = []
+    elements = get_elements(
+        Fresh(), element_test=lambda x: isinstance(x, list) and not seen.append(x)
+    )
+    assert list(elements) == ["ROOT.val"]
+    assert elements["ROOT.val"] is seen[0]
+
+
 @pytest.mark.parametrize("memoize", [True, False])
 def test_get_elements__by_path(obj_1: A, memoize: bool) -> None:
     correct = {"ROOT.new": -1}
     assert get_elements(obj_1, path_test=lambda x: x == "new", memoize=memoize) == correct
 
 
+ATTR = frozenset((Address.ATTR,))
+MAPPING = frozenset((Address.MUTABLE_MAPPING_KEY, Address.IMMUTABLE_MAPPING_KEY))
+SEQUENCE = frozenset((Address.MUTABLE_SEQUENCE_IDX, Address.IMMUTABLE_SEQUENCE_IDX))
+MEMBERS = frozenset((Address.MUTABLE_SET_ID, Address.IMMUTABLE_SET_ID, Address.VALUES_VIEW_ID))
+
+
+@pytest.mark.parametrize(
+    "query, steps",
+    [
+        ("ROOT", []),
+        ("ROOT.val", [(False, ATTR, "val")]),
+        (".*", [(False, ATTR, _MISSING)]),
+        ("['key']", [(False, MAPPING, "key")]),
+        ('[ "key" ]', [(False, MAPPING, "key")]),
+        ("[1]", [(False, SEQUENCE, 1)]),
+        ("[*]", [(False, MAPPING | SEQUENCE, _MISSING)]),
+        ("{*}", [(False, MEMBERS, _MISSING)]),
+        ("..val", [(True, ATTR, "val")]),
+        ("..[*]", [(True, MAPPING | SEQUENCE, _MISSING)]),
+        ("ROOT[0]..['k'].val", [(False, SEQUENCE, 0), (True, MAPPING, "k"), (False, ATTR, "val")]),
+    ],
+)
+def test_query_plan__parse(query: str, steps: list) -> None:
+    assert _QueryPlan(query).steps == steps
+
+
+@pytest.mark.parametrize("query", ["ROOT[", "val", "ROOT...val", "ROOT['k']val", "ROOT..", "[-1]"])
+def test_query_plan__invalid(query: str) -> None:
+    with pytest.raises(ValueError, match="Invalid path query"):
+        _QueryPlan(query)
+
+
+def test_query_plan__advance() -> None:
+    plan = _QueryPlan("['a']..b")
+    states = plan.advance(plan.initial, (Address.MUTABLE_MAPPING_KEY, "a"))
+    assert states == {1}
+    assert plan.advance(states, (Address.ATTR, "c")) == {1}
+    assert plan.advance(states, (Address.ATTR, "b")) == {1, 2}
+    assert plan.accepts({1, 2}) and plan.can_continue({1, 2})
+    assert not plan.can_continue({2})
+    assert plan.advance(plan.initial, (Address.MUTABLE_MAPPING_KEY, "b")) == set()
+    # Mapping keys are matched by their rendering
+    plan = _QueryPlan("['1']")
+    assert plan.advance(plan.initial, (Address.MUTABLE_MAPPING_KEY, 1)) == {1}
+    plan = _QueryPlan("[1]")
+    assert plan.advance(plan.initial, (Address.MUTABLE_MAPPING_KEY, 1)) == set()
+
+
+def test_get_elements__query() -> None:
+    services = [A(A(None)), {"x": A("c")}]
+    services[0].password = "a"
+    services[0].val.password = "b"
+    services[1]["x"].password = "c"
+    obj = {"services": services, "other": A("zzz"), "large": list(range(1000))}
+    obj["other"].password = "d"
+    elements = get_elements(obj, query="ROOT['services'][*]..password", max_nodes=20)
+    assert elements == {
+        "ROOT['services'][0].password": "a",
+        "ROOT['services'][0].val.password": "b",
+        "ROOT['services'][1]['x'].password": "c",
+    }
+    assert get_elements(obj, query="..password", element_test=lambda x: x != "a") == {
+        "ROOT['services'][0].val.password": "b",
+        "ROOT['services'][1]['x'].password": "c",
+        "ROOT['other'].password": "d",
+    }
+    assert get_elements(obj, query="ROOT['large'][999]") == {"ROOT['large'][999]": 999}
+    assert get_elements(obj, query="ROOT") == {"ROOT": obj}
+
+
+def test_overwrite_elements__query() -> None:
+    obj = {"services": [A("secret"), A("secret")], "other": A("secret")}
+    overwrite_elements(obj, overwrite_value="***", query="['services'][*].val")
+    assert [service.val for service in obj["services"]] == ["***", "***"]
+    assert obj["other"].val == "secret"
+    with hot_swap(obj, overwrite_value=None, query="..val"):
+        assert obj["other"].val is None
+    assert obj["other"].val == "secret"
+
+
+def test_get_elements__full_path_test() -> None:
+    obj = {"services": [A("a"), A("b")], "other": A("c")}
+    views = []
+
+    def under_services(path: _PathNode) -> bool:
+        views.append(path)
+        return len(path) > 1 and path[0] == (Address.MUTABLE_MAPPING_KEY, "services")
+
+    elements = get_elements(obj, path_test=lambda x: x == "val", full_path_test=under_services)
+    assert elements == {"ROOT['services'][0].val": "a", "ROOT['services'][1].val": "b"}
+    # The views are the traversal's own paths rather than per-element copies
+    assert all(isinstance(view, _PathNode) for view in views)
+    assert get_elements(
+        obj, full_path_test=lambda path: any(key == "other" for _, key in reversed(path))
+    ) == {"ROOT['other']": obj["other"], "ROOT['other'].val": "c"}
+
+
+def test_get_elements__structured_paths() -> None:
+    obj = {1: "int", "1": "str"}
+    assert get_elements(obj) == {"ROOT": obj, "ROOT['1']": "str"}
+    elements = get_elements(obj, structured_paths=True)
+    assert elements == {
+        Path(): obj,
+        Path([(Address.MUTABLE_MAPPING_KEY, 1)]): "int",
+        Path([(Address.MUTABLE_MAPPING_KEY, "1")]): "str",
+    }
+    assert all(isinstance(path, Path) for path in elements)
+    assert [str(path) for path in elements] == ["ROOT", "ROOT['1']", "ROOT['1']"]
+
+
+def test_get_elements_at_paths__structured_paths() -> None:
+    member = A(1)
+    obj = {"key": [A(0), {member}]}
+    paths = get_elements(obj, element_test=lambda x: isinstance(x, A), structured_paths=True)
+    assert get_elements_at_paths(obj, paths) == paths
+    assert get_elements_at_paths(obj, [[(Address.MUTABLE_MAPPING_KEY, "key")]]) == {
+        Path([(Address.MUTABLE_MAPPING_KEY, "key")]): obj["key"]
+    }
+
+
+def test_overwrite_elements_at_paths__structured_paths() -> None:
+    member = A(1)
+    obj = {"key": [A(0), {member}], "other": (A(2),)}
+    paths = get_elements(obj, element_test=lambda x: isinstance(x, A), structured_paths=True)
+    overwrite_elements_at_paths(obj, list(paths)[:2], overwrite_func=lambda x: x.val, silent=True)
+    assert obj["key"] == [0, {1}]
+    with pytest.raises(TypeError):
+        overwrite_elements_at_paths(obj, list(paths)[2:], silent=True)
+
+
+def test_get_aliases() -> None:
+    config = {"level": "debug"}
+    handlers = [A(config) for _ in range(500)]
+    aliases = get_aliases({"handlers": handlers}, element_test=lambda x: x is config)
+    assert aliases == {
+        "ROOT['handlers'][0].val": [f"ROOT['handlers'][{i}].val" for i in range(1, 500)]
+    }
+    # Each element is explored once, so the contents of config are only reported once
+    aliases = get_aliases({"handlers": handlers}, path_test=lambda x: x == "level")
+    assert aliases == {"ROOT['handlers'][0].val['level']": []}
+
+
+def test_get_aliases__cycle() -> None:
+    node = A([1, 1])
+    node.val.append(node)
+    node.val.append(node.val)
+    assert get_aliases(node) == {
+        "ROOT": ["ROOT.val[2]"],
+        "ROOT.val": ["ROOT.val[3]"],
+        "ROOT.val[0]": [],
+        "ROOT.val[1]": [],
+    }
+
+
+@pytest.mark.parametrize("memoize", [True, False])
+def test_iter_elements(obj_1: A, memoize: bool) -> None:
+    elements = iter_elements(obj_1, element_test=lambda x: isinstance(x, int), memoize=memoize)
+    assert list(elements) == list(
+        get_elements(obj_1, element_test=lambda x: isinstance(x, int), memoize=memoize).items()
+    )
+
+
+def test_iter_elements__lazy() -> None:
+    visited = []
+    obj = list(range(100))
+    elements = iter_elements(obj, element_test=lambda x: not visited.append(x))
+    assert next(elements) == ("ROOT", obj)
+    assert next(elements) == ("ROOT[0]", 0)
+    assert len(visited) == 2
+
+
 @pytest.mark.parametrize("memoize", [True, False])
 def test_overwrite_elements__by_element(obj_4: dict[str, Any], memoize: bool) -> None:
     paths = list(
@@ -1259,6 +2007,215 @@ def test_print_object_tree_max(
     assert correct_output == out
 
 
+def test_print_object_tree_max__stops_traversal(capsys: CaptureFixture) -> None:
+    visited = []
+    print_obj_tree(list(range(100)), element_test=lambda x: not visited.append(x), max=10)
+    out, err = capsys.readouterr()
+    assert len(out.splitlines()) == 10
+    assert len(visited) == 10
+
+
+def test_print_obj_tree__cycle(capsys: CaptureFixture) -> None:
+    node = A([1])
+    node.val.append(node)
+    print_obj_tree(node)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[-1] == "ROOT.val[1] -> <cycle to ROOT>"
+    assert len(lines) == 4
+
+
+@pytest.mark.parametrize("memoize", [True, False])
+def test_overwrite_elements__single_pass(memoize: bool) -> None:
+    def make_obj() -> dict:
+        shared = A([1, 2])
+        return {"a": [shared, shared, ("3", {4: "4"})], "b": {5, 6}, "c": A(A(7))}
+
+    expected, obj = make_obj(), make_obj()
+    overwrite_elements(expected, overwrite_func=str, element_test=lambda x: isinstance(x, int))
+    overwrite_elements(
+        obj,
+        overwrite_func=str,
+        element_test=lambda x: isinstance(x, int),
+        memoize=memoize,
+        single_pass=True,
+    )
+    assert obj["a"][0].val == expected["a"][0].val == ["1", "2"]
+    assert obj["a"][2] == expected["a"][2] == ("3", {4: "4"})
+    assert obj["b"] == expected["b"] == {"5", "6"}
+    assert obj["c"].val.val == expected["c"].val.val == "7"
+
+
+def test_overwrite_elements__single_pass_does_not_descend() -> None:
+    obj = {"a": [[1], 2]}
+    overwrite_elements(
+        obj, overwrite_func=lambda x: [x], element_test=lambda x: isinstance(x, list)
+    )
+    # Paths below ROOT['a'] are resolved within its new value
+    assert obj == {"a": [[[[1], 2]]]}
+    obj = {"a": [[1], 2]}
+    overwrite_elements(
+        obj,
+        overwrite_func=lambda x: [x],
+        element_test=lambda x: isinstance(x, list),
+        single_pass=True,
+    )
+    assert obj == {"a": [[[1], 2]]}
+    with pytest.raises(IndexError):
+        overwrite_elements(obj, single_pass=True)
+
+
+def test_overwrite_elements__single_pass_failures() -> None:
+    obj = {"t": ([1],)}
+    overwrite_elements(
+        obj,
+        element_test=lambda x: isinstance(x, (list, int)),
+        single_pass=True,
+        silent=True,
+        raise_on_exception=False,
+    )
+    # The list could not be overwritten, so its contents are still explored
+    assert obj == {"t": ([None],)}
+    with pytest.raises(TypeError):
+        overwrite_elements(
+            obj, element_test=lambda x: isinstance(x, list), single_pass=True, silent=True
+        )
+
+
+Point = namedtuple("Point", ["x", "y"])
+
+
+def test_transformed_copy() -> None:
+    untouched = {"z": ["0"]}
+    obj = {
+        "list": [1, "a", untouched],
+        "tuple": (2, Point(3, "b")),
+        "sets": [frozenset({4}), {"c"}],
+        "proxy": MappingProxyType({"d": 5}),
+        "attr": A(6),
+        "other": untouched,
+    }
+    new = transformed_copy(obj, overwrite_func=str, element_test=lambda x: type(x) is int)
+    assert new == {
+        "list": ["1", "a", untouched],
+        "tuple": ("2", Point("3", "b")),
+        "sets": [frozenset({"4"}), {"c"}],
+        "proxy": MappingProxyType({"d": "5"}),
+        "attr": new["attr"],
+        "other": untouched,
+    }
+    assert type(new["tuple"][1]) is Point and new["attr"].val == "6"
+    # root_obj is untouched and shares everything that was not copied
+    assert obj["list"] == [1, "a", untouched] and obj["attr"].val == 6 and obj["tuple"][0] == 2
+    assert new["list"][2] is untouched and new["other"] is untouched
+    assert new["sets"][1] is obj["sets"][1]
+
+
+def test_transformed_copy__aliases() -> None:
+    shared = [1, [2]]
+    obj = {"a": shared, "b": shared, "c": [3]}
+    new = transformed_copy(obj, None, element_test=lambda x: x == 2)
+    assert new == {"a": [1, [None]], "b": [1, [None]], "c": [3]}
+    assert new["a"] is new["b"] and new["c"] is obj["c"] and shared == [1, [2]]
+
+
+def test_transformed_copy__aliases_with_different_replacements() -> None:
+    shared = {"p": 1, "q": {"r": 2}}
+    obj = {"a": shared, "b": {"c": shared}}
+    # The contents of shared["q"] are only explored below obj["a"]
+    with pytest.warns(TraversalTruncatedWarning):
+        new = transformed_copy(obj, "x", element_test=lambda x: type(x) is int, max_depth=3)
+    assert new == {"a": {"p": "x", "q": {"r": "x"}}, "b": {"c": {"p": "x", "q": {"r": "x"}}}}
+    assert new["a"] is new["b"]["c"] and shared == {"p": 1, "q": {"r": 2}}
+
+    shared = {"p": 1, "q": 2}
+    calls = []
+
+    def overwrite_func(x: int) -> str:
+        calls.append(x)
+        return "x"
+
+    new = transformed_copy(
+        {"a": shared, "b": shared},
+        overwrite_func=overwrite_func,
+        full_path_test=lambda path: [step[1] for step in path] in [["a", "p"], ["b", "q"]],
+    )
+    assert new == {"a": {"p": "x", "q": "x"}, "b": {"p": "x", "q": "x"}}
+    assert sorted(calls) == [1, 2]
+
+
+def test_transformed_copy__memoize() -> None:
+    shared = {"p": 1}
+    obj = {"a": shared, "b": [shared, (shared,)], "c": [2]}
+    new = transformed_copy(obj, "x", element_test=lambda x: type(x) is int, memoize=True)
+    assert new == {"a": {"p": "x"}, "b": [{"p": "x"}, ({"p": "x"},)], "c": ["x"]}
+    assert new["a"] is new["b"][0] and new["a"] is new["b"][1][0] and shared == {"p": 1}
+
+
+def test_transformed_copy__cycles() -> None:
+    obj = [1]
+    obj.append(obj)
+    new = transformed_copy(obj, 0, element_test=lambda x: x == 1)
+    assert new[0] == 0 and new[1] is new and obj[0] == 1 and obj[1] is obj
+    # Immutable containers are only created once their contents are copied
+    inner = [1]
+    obj = (inner,)
+    inner.append(obj)
+    new = transformed_copy(obj, 0, element_test=lambda x: x == 1)
+    assert new[0][0] == 0 and new[0][1] is obj
+
+
+def test_transformed_copy__root() -> None:
+    obj = [1, [2]]
+    assert transformed_copy(obj, None, element_test=lambda x: x == 3) is obj
+    assert transformed_copy(obj, "root", element_test=lambda x: x is obj) == "root"
+    assert obj == [1, [2]]
+    # Nothing below a replaced root_obj survives in the copy
+    for obj in [{"a": 1}, (1, 2), {"a": [1, 2]}]:
+        assert transformed_copy(obj) is None
+        assert transformed_copy(obj, overwrite_func=str) == str(obj)
+    obj = {"a": [1, 2], "b": 3}
+    new = transformed_copy(obj, overwrite_func=str, path_test=lambda x: x != "")
+    assert new == {"a": "[1, 2]", "b": "3"} and obj == {"a": [1, 2], "b": 3}
+
+
+def test_transformed_copy__not_copyable() -> None:
+    with pytest.raises(TypeError, match="Cannot copy range with replaced elements."):
+        transformed_copy(range(3), 0, element_test=lambda x: x == 1)
+
+
+def test_overwrite_elements__descend_test(obj_4: dict[str, Any]) -> None:
+    overwrite_elements(
+        obj_4,
+        overwrite_value=None,
+        element_test=lambda x: isinstance(x, int),
+        descend_test=lambda x, step: not isinstance(x, A),
+    )
+    assert obj_4["key"][:2] == [None, [None]]
+    assert obj_4["key"][2][0].val == 4
+
+
+def test_hot_swap__descend_test(obj_4: dict[str, Any]) -> None:
+    with hot_swap(
+        obj_4,
+        overwrite_value=None,
+        element_test=lambda x: isinstance(x, int),
+        descend_test=lambda x, step: step != (Address.MUTABLE_SEQUENCE_IDX, 1),
+    ):
+        assert obj_4["key"][:2] == [None, [2]]
+        assert obj_4["key"][2][0].val is None
+    assert obj_4["key"][:2] == [1, [2]]
+    assert obj_4["key"][2][0].val == 4
+
+
+def test_hot_swap__truncation_as_error(obj_4: dict[str, Any]) -> None:
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", TraversalTruncatedWarning)
+        with pytest.raises(TraversalTruncatedWarning):
+            with hot_swap(obj_4, None, element_test=lambda x: isinstance(x, int), max_nodes=4):
+                pass
+    assert obj_4 == {"key": [1, [2], [obj_4["key"][2][0]]]}
+
+
 @pytest.mark.parametrize("memoize", [True, False])
 def test_hot_swap(obj_2: dict[str, Any], memoize: bool) -> None:
     original_paths = _get_paths(obj_2, element_test=lambda x: isinstance(x, A), memoize=memoize)
@@ -1284,6 +2241,283 @@ def test_hot_swap_func(obj_2: dict[str, Any]) -> None:
     )
 
 
+def test_hot_swap__restores_parents_directly() -> None:
+    original = A(1)
+    inner = [original]
+    obj = {"a": inner}
+    with hot_swap(obj, None, element_test=lambda x: isinstance(x, A)):
+        obj["a"] = []
+    assert obj["a"] == [] and inner == [original]
+
+    inner = [original]
+    obj = {"b": {"c": [inner]}}
+    outer = obj["b"]["c"]
+    with hot_swap(obj, overwrite_func=lambda x: [x], element_test=lambda x: isinstance(x, list)):
+        # Elements below a swapped element were swapped within its new value
+        assert obj["b"]["c"] == [[[[original]]]]
+    assert obj["b"]["c"] is outer and outer[0] is inner and inner == [original]
+
+
+def test_undo_journal() -> None:
+    obj = {"a": [1, 2, 3], "b": {"x": 1, "y": 2}, "c": A(1), "d": {1, 2}}
+    snapshot = {"a": [1, 2, 3], "b": {"x": 1, "y": 2}, "d": {1, 2}}
+    journal = []
+    _overwrite_elements_at_paths(
+        obj,
+        _get_paths(obj, element_test=lambda x: isinstance(x, int)),
+        overwrite_func=lambda x: -x,
+        journal=journal,
+    )
+    assert obj["a"] == [-1, -2, -3] and obj["d"] == {-1, -2} and obj["c"].val == -1
+    assert len(journal) == 8
+    _undo_journal(journal)
+    assert not journal
+    assert {key: value for key, value in obj.items() if key != "c"} == snapshot
+    assert obj["c"].val == 1
+
+
+def make_request(idx: int) -> dict[str, Any]:
+    return {"id": idx, "user": A(f"user {idx}"), "items": [A(idx), "x", A(-idx)]}
+
+
+def test_compile_hot_swap(monkeypatch: pytest.MonkeyPatch) -> None:
+    plan = compile_hot_swap(make_request(0), element_test=lambda x: isinstance(x, A))
+    assert sorted(map(str, plan.paths)) == ["ROOT['items'][0]", "ROOT['items'][2]", "ROOT['user']"]
+
+    def fail(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("Paths of a matching object were searched.")
+
+    monkeypatch.setattr(spelunk.spelunk, "_get_paths", fail)
+    obj = make_request(1)
+    user, items = obj["user"], list(obj["items"])
+    with hot_swap(obj, overwrite_func=lambda x: x.val, plan=plan):
+        assert obj == {"id": 1, "user": "user 1", "items": [1, "x", -1]}
+    assert obj["user"] is user and obj["items"] == items
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        {"id": 1, "user": A("user 1"), "items": [A(1)]},  # Missing element
+        {"id": 1, "user": A("user 1"), "items": [A(1), "x", "y"]},  # Failed element_test
+        {"id": 1, "user": A("user 1"), "items": {0: A(1), 2: A(-1)}},  # Other address type
+        {"id": 1, "user": None, "items": [A(1), "x", A(-1)], "admin": A("admin")},
+    ],
+)
+def test_hot_swap__plan_mismatch(obj: dict[str, Any]) -> None:
+    plan = compile_hot_swap(make_request(0), element_test=lambda x: isinstance(x, A))
+    expected = {key: value.val if isinstance(value, A) else value for key, value in obj.items()}
+    items = obj["items"]
+    if isinstance(items, dict):
+        expected["items"] = {key: value.val for key, value in items.items()}
+    else:
+        expected["items"] = [x.val if isinstance(x, A) else x for x in items]
+    with hot_swap(obj, overwrite_func=lambda x: x.val, plan=plan, allow_mutable_set_mutations=True):
+        assert obj == expected
+
+
+def test_hot_swap__plan_descend_test() -> None:
+    plan = compile_hot_swap(
+        {"a": [1], "b": (2,)},
+        element_test=lambda x: isinstance(x, int),
+        descend_test=lambda x, step: not isinstance(x, tuple),
+    )
+    obj = {"a": (1,), "b": [2]}
+    with hot_swap(obj, None, plan=plan):
+        assert obj == {"a": (1,), "b": [None]}
+    assert obj == {"a": (1,), "b": [2]}
+
+
+def test_compile_hot_swap__with_set() -> None:
+    plan = compile_hot_swap({"a": [1, {2}]}, element_test=lambda x: x == 2)
+    assert plan.paths is None
+    obj = {"a": [1, {2}]}
+    with pytest.raises(TypeError):
+        with hot_swap(obj, None, plan=plan):
+            pass
+    with hot_swap(obj, 3, plan=plan, allow_mutable_set_mutations=True):
+        assert obj == {"a": [1, {3}]}
+    assert obj == {"a": [1, {2}]}
+
+
+def test_hot_swap__nested() -> None:
+    obj = {"a": [1, A(2)], "b": "c"}
+    with hot_swap(obj, None, element_test=lambda x: isinstance(x, int)):
+        with hot_swap(obj, "x", element_test=lambda x: x is None):
+            assert obj["a"][0] == "x" and obj["a"][1].val == "x"
+        assert obj["a"][0] is None and obj["a"][1].val is None
+    assert obj["a"][0] == 1 and obj["a"][1].val == 2 and not _ACTIVE_SWAPS._owners
+
+
+def swap_in_thread(obj: Any, entered: threading.Event, done: threading.Event) -> threading.Thread:
+    def swap() -> None:
+        with hot_swap(obj, None, element_test=lambda x: isinstance(x, A)):
+            entered.set()
+            done.wait()
+
+    thread = threading.Thread(target=swap)
+    thread.start()
+    entered.wait()
+    return thread
+
+
+def test_hot_swap__threads() -> None:
+    shared = [A(1)]
+    obj = {"a": shared, "b": [A(2)]}
+    entered, done = threading.Event(), threading.Event()
+    thread = swap_in_thread({"shared": shared}, entered, done)
+    with pytest.raises(RuntimeError):
+        with hot_swap(obj, "x", element_test=lambda x: x is None, lock_timeout=0):
+            pass
+    # Swaps that do not share containers run in parallel
+    with hot_swap(obj["b"], "x", element_test=lambda x: isinstance(x, A), lock_timeout=0):
+        assert obj["b"] == ["x"]
+    # Overlapping swaps wait for each other and only see the original elements
+    threading.Timer(0.05, done.set).start()
+    with hot_swap(obj, "x", element_test=lambda x: isinstance(x, A) or x is None):
+        assert obj == {"a": ["x"], "b": ["x"]}
+    thread.join()
+    assert shared[0].val == 1 and obj["b"][0].val == 2 and not _ACTIVE_SWAPS._owners
+
+
+def test_swap_registry__repeats_search() -> None:
+    obj = [A(1)]
+    entered, done = threading.Event(), threading.Event()
+    epoch = _ACTIVE_SWAPS.begin_search()
+    try:
+        # A swap along obj starting and ending during the search invalidates it
+        thread = swap_in_thread(obj, entered, done)
+        done.set()
+        thread.join()
+        assert _ACTIVE_SWAPS.acquire({id(obj): obj}, epoch) is None
+    finally:
+        _ACTIVE_SWAPS.end_search()
+    epoch = _ACTIVE_SWAPS.begin_search()
+    try:
+        assert _ACTIVE_SWAPS.acquire({id(obj): obj}, epoch) == {id(obj): obj}
+        _ACTIVE_SWAPS.release({id(obj): obj})
+    finally:
+        _ACTIVE_SWAPS.end_search()
+    assert not _ACTIVE_SWAPS._owners and not _ACTIVE_SWAPS._touched
+
+
+async def count_ticks(ticks: list[int]) -> None:
+    while True:
+        ticks[0] += 1
+        await asyncio.sleep(0)
+
+
+async def run_with_ticker(coro: Any) -> tuple[Any, int]:
+    ticks = [0]
+    ticker = asyncio.ensure_future(count_ticks(ticks))
+    await asyncio.sleep(0)
+    start = ticks[0]
+    try:
+        return await coro, ticks[0] - start
+    finally:
+        ticker.cancel()
+
+
+@pytest.mark.parametrize("structured_paths", [True, False])
+def test_aiter_elements(structured_paths: bool) -> None:
+    obj = {"a": [[i, str(i)] for i in range(100)], "b": A(-1)}
+
+    async def collect() -> list:
+        elements = aiter_elements(
+            obj, element_test=lambda x: isinstance(x, int), structured_paths=structured_paths
+        )
+        return [element async for element in elements]
+
+    expected = list(
+        iter_elements(
+            obj, element_test=lambda x: isinstance(x, int), structured_paths=structured_paths
+        )
+    )
+    assert asyncio.run(run_with_ticker(collect()))[0] == expected
+
+
+def test_aiter_elements__chunks() -> None:
+    obj = [[i] for i in range(100)]
+
+    async def collect(chunk_size: int) -> list:
+        elements = aiter_elements(
+            obj, element_test=lambda x: isinstance(x, int), chunk_size=chunk_size
+        )
+        return [element async for element in elements]
+
+    elements, ticks = asyncio.run(run_with_ticker(collect(10)))
+    assert len(elements) == 100 and ticks >= 20  # 201 elements were visited
+    assert asyncio.run(run_with_ticker(collect(1000)))[1] == 0
+
+
+def test_async_hot_swap() -> None:
+    obj = {"a": [A(i) for i in range(100)], "b": [1]}
+
+    async def swap() -> None:
+        async with async_hot_swap(
+            obj,
+            overwrite_func=lambda x: x.val,
+            element_test=lambda x: isinstance(x, A),
+            chunk_size=5,
+        ):
+            assert obj["a"] == list(range(100))
+
+    assert asyncio.run(run_with_ticker(swap()))[1] >= 40  # 203 elements were visited
+    assert [x.val for x in obj["a"]] == list(range(100)) and not _ACTIVE_SWAPS._owners
+
+
+@pytest.mark.parametrize("during_search", [True, False])
+def test_async_hot_swap__cancelled(during_search: bool) -> None:
+    obj = [A(i) for i in range(100)]
+    entered = []
+
+    async def swap() -> None:
+        async with async_hot_swap(obj, None, element_test=lambda x: isinstance(x, A), chunk_size=1):
+            entered.append(obj.count(None))
+            await asyncio.sleep(10)
+
+    async def cancel() -> None:
+        task = asyncio.ensure_future(swap())
+        for _ in range(5 if during_search else 500):
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert entered == ([] if during_search else [100])
+    assert [x.val for x in obj] == list(range(100)) and not _ACTIVE_SWAPS._owners
+
+
+def test_async_hot_swap__tasks() -> None:
+    shared = [A(1)]
+    obj = {"a": shared}
+
+    async def hold(entered: asyncio.Event, done: asyncio.Event) -> None:
+        async with async_hot_swap({"shared": shared}, element_test=lambda x: isinstance(x, A)):
+            entered.set()
+            await done.wait()
+
+    async def swap() -> None:
+        entered, done = asyncio.Event(), asyncio.Event()
+        task = asyncio.ensure_future(hold(entered, done))
+        await entered.wait()
+        with pytest.raises(RuntimeError):
+            async with async_hot_swap(obj, "x", element_test=lambda x: x is None, lock_timeout=0):
+                pass
+        # Blocking would prevent the other task from ever ending the overlapping swap
+        with pytest.raises(RuntimeError):
+            with hot_swap(obj, "x", element_test=lambda x: x is None):
+                pass
+        asyncio.get_running_loop().call_later(0.05, done.set)
+        async with async_hot_swap(obj, "x", element_test=lambda x: isinstance(x, A) or x is None):
+            assert obj == {"a": ["x"]}
+        await task
+
+    asyncio.run(swap())
+    assert shared[0].val == 1 and not _ACTIVE_SWAPS._owners
+
+
 @pytest.mark.parametrize("memoize", [True, False])
 def test_hot_swap__with_immutable_obj(memoize: bool) -> None:
     obj = (1, 2, 3)